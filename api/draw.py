@@ -0,0 +1,152 @@
+"""
+Vercel Serverless Function: сводка розыгрыша для веб-приложения (только чтение, кэшируется CDN)
+"""
+from http.server import BaseHTTPRequestHandler
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from bot.utils.cache import TTLCache
+from bot.utils.rest import execute, is_malformed_id
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд CDN отдает сводку без обращения к функции и сколько еще —
+# устаревшую, пока в фоне запрашивает свежую. Завершенный розыгрыш не меняется
+DRAW_INFO_MAX_AGE = int(os.getenv('DRAW_INFO_MAX_AGE', '30'))
+DRAW_INFO_STALE = int(os.getenv('DRAW_INFO_STALE', '300'))
+DRAW_INFO_FINAL_MAX_AGE = int(os.getenv('DRAW_INFO_FINAL_MAX_AGE', '3600'))
+
+DRAW_INFO_COLUMNS = 'id, title, prizes, channels, end_date, status, winners_count'
+
+# Теплый инстанс тоже держит сводку max-age секунд: запросы мимо CDN
+# (другой регион, промах кэша) не доходят до Supabase чаще раза за окно
+summary_cache = TTLCache(int(os.getenv('DRAW_CACHE_SIZE', '1000')))
+
+
+def _max_age(summary: Optional[Dict[str, Any]]) -> int:
+    if summary is not None and summary['status'] == 'completed':
+        return DRAW_INFO_FINAL_MAX_AGE
+    return DRAW_INFO_MAX_AGE
+
+
+def _load_summary(supabase_url: str, supabase_key: str, draw_id: str) -> Optional[Dict[str, Any]]:
+    """Розыгрыш и число участников из БД; None — не найден"""
+    try:
+        result = execute(
+            supabase_url, supabase_key,
+            lambda supabase: supabase.table("draws").select(DRAW_INFO_COLUMNS).eq("id", draw_id)
+        )
+    except Exception as e:
+        if not is_malformed_id(e):
+            raise
+        return None
+    if not result.data:
+        return None
+    draw = result.data[0]
+
+    participants = execute(
+        supabase_url, supabase_key,
+        lambda supabase: supabase.table("participants").select(
+            "id", count="exact"
+        ).eq("draw_id", draw_id).limit(1)
+    ).count
+    return {
+        'id': str(draw['id']),
+        'title': draw['title'],
+        'prizes': draw['prizes'],
+        'channels': [channel['username'] for channel in draw['channels']],
+        'end_date': draw['end_date'],
+        'timezone': os.getenv('TIMEZONE', 'Europe/Moscow'),
+        'status': draw['status'],
+        'winners_count': draw['winners_count'],
+        'participants': participants or 0
+    }
+
+
+def get_summary(supabase_url: str, supabase_key: str, draw_id: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Сводка (None — не найден) и ее ETag"""
+    cached = summary_cache.get(draw_id)
+    if cached is None:
+        summary = _load_summary(supabase_url, supabase_key, draw_id)
+        body = json.dumps(summary, ensure_ascii=False, sort_keys=True)
+        cached = (summary, f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()[:16]}"')
+        summary_cache.set(draw_id, cached, _max_age(summary))
+    return cached
+
+
+class handler(BaseHTTPRequestHandler):
+    """Handler для Vercel serverless function"""
+
+    def do_GET(self):
+        """Сводка розыгрыша: GET /api/draw?draw_id=..."""
+        draw_id = parse_qs(urlparse(self.path).query).get('draw_id', [''])[0].strip()
+        if not draw_id:
+            self._send_json(400, {'success': False, 'message': 'Не указан draw_id'}, cache=False)
+            return
+
+        supabase_url = os.getenv('SUPABASE_URL')
+        supabase_key = os.getenv('SUPABASE_KEY')
+        if not all([supabase_url, supabase_key]):
+            self._send_json(500, {'success': False, 'message': 'Ошибка конфигурации сервера'}, cache=False)
+            return
+
+        try:
+            summary, etag = get_summary(supabase_url, supabase_key, draw_id)
+        except Exception as e:
+            logger.error(f"Ошибка получения розыгрыша {draw_id}: {e}")
+            self._send_json(502, {'success': False, 'message': 'Ошибка получения розыгрыша'}, cache=False)
+            return
+
+        max_age = _max_age(summary)
+        if etag in [tag.strip() for tag in (self.headers.get('If-None-Match') or '').split(',')]:
+            self.send_response(304)
+            self._send_cache_headers(etag, max_age)
+            self.end_headers()
+            return
+
+        if summary is None:
+            self._send_json(404, {'success': False, 'message': 'Розыгрыш не найден'}, etag=etag, max_age=max_age)
+        else:
+            self._send_json(200, {'success': True, 'draw': summary}, etag=etag, max_age=max_age)
+
+    def do_OPTIONS(self):
+        """Обработка OPTIONS запроса для CORS"""
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match')
+        self.end_headers()
+
+    def _send_cache_headers(self, etag: str, max_age: int):
+        # Браузер каждый раз сверяется по ETag, кэширует CDN (s-maxage)
+        self.send_header('ETag', etag)
+        self.send_header(
+            'Cache-Control',
+            f'public, max-age=0, s-maxage={max_age}, stale-while-revalidate={DRAW_INFO_STALE}'
+        )
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers', 'ETag')
+
+    def _send_json(
+        self,
+        status: int,
+        payload: Dict[str, Any],
+        etag: Optional[str] = None,
+        max_age: int = 0,
+        cache: bool = True
+    ):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if cache:
+            self._send_cache_headers(etag, max_age)
+        else:
+            self.send_header('Cache-Control', 'no-store')
+            self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
@@ -3,31 +3,199 @@ Vercel Serverless Function для проверки подписок и реги
 """
 from http.server import BaseHTTPRequestHandler
 import json
+import logging
 import os
-from typing import Dict, Any
+import importlib
+import time
+from typing import Dict, Any, Optional, TYPE_CHECKING
 import asyncio
+from datetime import datetime
+from zoneinfo import ZoneInfo
 
-try:
+# aiohttp, supabase и httpx импортируются при первом обращении к Telegram/БД:
+# на холодном старте их загрузка — основная часть времени до первого ответа,
+# а ответы по фильтру Блума и кэшу обходятся без них
+if TYPE_CHECKING:
     import aiohttp
-    from supabase import create_client
-except ImportError:
-    pass
+
+from bot.utils.cache import CacheBackend, SubscriptionCache, TTLCache
+from bot.utils.bloom import BloomFilter, MembershipFilters
+from bot.utils.concurrency import gather_failures
+from bot.utils.dates import parse_end_date
+from bot.utils.rest import (
+    execute as _execute, is_malformed_id, select_draw_meta, select_participant, select_participants_page,
+    upsert_participant
+)
+from bot.utils.webapp import InitDataError, validate_init_data
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHECK_CONCURRENCY = int(os.getenv('CHECK_CONCURRENCY', '5'))
+CHECK_TIMEOUT = float(os.getenv('CHECK_TIMEOUT', '5'))
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+TIMEZONE = os.getenv('TIMEZONE', 'Europe/Moscow')
+# Сколько секунд действительна подпись initData после открытия веб-приложения
+INIT_DATA_MAX_AGE = float(os.getenv('INIT_DATA_MAX_AGE', '3600'))
+
+
+def _create_cache_backend() -> CacheBackend:
+    """Бэкенд кэша подписок: по умолчанию память теплого инстанса.
+
+    SUBSCRIPTION_CACHE_BACKEND="module:factory" подключает внешнее хранилище,
+    общее для всех инстансов функции.
+    """
+    backend_path = os.getenv('SUBSCRIPTION_CACHE_BACKEND')
+    if not backend_path:
+        return TTLCache(int(os.getenv('SUBSCRIPTION_CACHE_SIZE', '10000')))
+    module_name, _, factory_name = backend_path.partition(':')
+    return getattr(importlib.import_module(module_name), factory_name)()
+
+
+subscription_cache = SubscriptionCache(
+    backend=_create_cache_backend(),
+    positive_ttl=float(os.getenv('SUBSCRIPTION_CACHE_TTL', '300')),
+    negative_ttl=float(os.getenv('SUBSCRIPTION_CACHE_NEGATIVE_TTL', '10'))
+)
+
+# Клиенты живут между вызовами теплого инстанса: соединения и TLS-сессии
+# с Supabase и api.telegram.org не устанавливаются заново на каждый запрос
+_runner: Optional[asyncio.Runner] = None
+_session: Optional["aiohttp.ClientSession"] = None
+
+
+def _get_runner() -> asyncio.Runner:
+    """Постоянный event loop: aiohttp-сессия привязана к нему"""
+    global _runner, _session
+    if _runner is None or _runner.get_loop().is_closed():
+        _runner = asyncio.Runner()
+        _session = None
+    return _runner
+
+
+async def _get_session() -> "aiohttp.ClientSession":
+    """aiohttp-сессия с keep-alive и кэшем DNS"""
+    global _session
+    if _session is None or _session.closed:
+        import aiohttp
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=int(os.getenv('TELEGRAM_POOL_SIZE', '20')),
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            ),
+            timeout=aiohttp.ClientTimeout(total=CHECK_TIMEOUT)
+        )
+    return _session
+
+
+def register_participant(supabase_url: str, supabase_key: str, row: Dict[str, Any]) -> bool:
+    """Зарегистрировать участника; True — добавлен сейчас, False — уже был.
+
+    INSERT ... ON CONFLICT (draw_id, user_id) DO NOTHING: PostgREST возвращает только добавленные строки
+    """
+    result = _execute(supabase_url, supabase_key, lambda supabase: upsert_participant(supabase, row))
+    return bool(result.data)
+
+
+# Повторные нажатия «Участвовать» отвечаются по фильтру Блума без Telegram: одним точным запросом
+membership_filters = MembershipFilters(
+    capacity=int(os.getenv('MEMBERSHIP_FILTER_CAPACITY', '100000')),
+    error_rate=float(os.getenv('MEMBERSHIP_FILTER_ERROR_RATE', '0.001')),
+    max_draws=int(os.getenv('MEMBERSHIP_FILTER_MAX_DRAWS', '50')),
+    ttl=float(os.getenv('MEMBERSHIP_FILTER_TTL', '600'))
+)
+MEMBERSHIP_FILTER_BUILD_LIMIT = int(os.getenv('MEMBERSHIP_FILTER_BUILD_LIMIT', '20000'))
+PARTICIPANTS_PAGE_SIZE = int(os.getenv('PARTICIPANTS_PAGE_SIZE', '1000'))
+
+
+def _build_membership_filter(supabase_url: str, supabase_key: str, draw_id: str, bloom: BloomFilter):
+    """Заполнить фильтр user_id из participants (не больше MEMBERSHIP_FILTER_BUILD_LIMIT строк)"""
+    last_id = None
+    while bloom.count < MEMBERSHIP_FILTER_BUILD_LIMIT:
+        rows = _execute(
+            supabase_url, supabase_key,
+            lambda supabase: select_participants_page(supabase, draw_id, "id, user_id", PARTICIPANTS_PAGE_SIZE, last_id)
+        ).data
+        if not rows:
+            break
+        for row in rows:
+            bloom.add(int(row['user_id']))
+        last_id = rows[-1]['id']
+
+
+def _start_filter_build(supabase_url: str, supabase_key: str, draw_id: str):
+    """Строить фильтр в фоновом потоке: запрос, который его запустил, не ждет
+    постраничного чтения участников — он все равно делает точную вставку"""
+    bloom = membership_filters.create(draw_id)
+    future = asyncio.get_running_loop().run_in_executor(
+        None, _build_membership_filter, supabase_url, supabase_key, draw_id, bloom
+    )
+
+    def done(future):
+        if future.exception() is not None:
+            # Недостроенный фильтр дает ложные «нет»: это лишь лишняя вставка, но лучше перестроить
+            membership_filters.drop(draw_id)
+            logger.warning(f"Не удалось построить фильтр участников {draw_id}: {future.exception()}")
+
+    future.add_done_callback(done)
+
+
+def _is_participant(supabase_url: str, supabase_key: str, draw_id: str, user_id: int) -> bool:
+    result = _execute(supabase_url, supabase_key, lambda supabase: select_participant(supabase, draw_id, user_id))
+    return bool(result.data)
+
+
+# Метаданные розыгрышей: только поля для регистрации; несуществующие draw_id
+# тоже запоминаются, чтобы перебор мусорных id не доходил до БД
+draw_cache = TTLCache(int(os.getenv('DRAW_CACHE_SIZE', '1000')))
+DRAW_CACHE_TTL = float(os.getenv('DRAW_CACHE_TTL', '30'))
+DRAW_CACHE_NEGATIVE_TTL = float(os.getenv('DRAW_CACHE_NEGATIVE_TTL', '300'))
+
+
+def _get_draw(supabase_url: str, supabase_key: str, draw_id: str) -> Optional[Dict[str, Any]]:
+    """Розыгрыш из кэша или БД; None — не найден"""
+    cached = draw_cache.get(draw_id)
+    if cached is not None:
+        return cached or None
+    try:
+        result = _execute(supabase_url, supabase_key, lambda supabase: select_draw_meta(supabase, draw_id))
+        draw = result.data[0] if result.data else None
+    except Exception as e:
+        if not is_malformed_id(e):
+            raise
+        draw = None
+    draw_cache.set(draw_id, draw or {}, DRAW_CACHE_TTL if draw else DRAW_CACHE_NEGATIVE_TTL)
+    return draw
+
 
 class handler(BaseHTTPRequestHandler):
     """Handler для Vercel serverless function"""
     
     def do_POST(self):
         """Обработка POST запроса"""
+        started = time.perf_counter()
+        # Длительность этапов запроса (мс) для Server-Timing и лога
+        self.timings: Dict[str, float] = {}
         try:
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
             data = json.loads(post_data.decode('utf-8'))
             
-            result = asyncio.run(self.process_request(data))
+            result = _get_runner().run(self.process_request(data))
+            self.timings['total'] = (time.perf_counter() - started) * 1000
+            logger.info(
+                f"verify draw={data.get('draw_id')} success={result.get('success')} "
+                + " ".join(f"{name}={duration:.1f}ms" for name, duration in self.timings.items())
+            )
             
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Expose-Headers', 'Server-Timing')
+            self.send_header('Server-Timing', ', '.join(
+                f"{name};dur={duration:.1f}" for name, duration in self.timings.items()
+            ))
             self.end_headers()
             self.wfile.write(json.dumps(result).encode('utf-8'))
             
@@ -42,16 +210,11 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
     
+    def _mark(self, phase: str, started: float):
+        self.timings[phase] = (time.perf_counter() - started) * 1000
+    
     async def process_request(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Обработка запроса"""
-        user_id = data.get('user_id')
-        first_name = data.get('first_name')
-        username = data.get('username')
-        draw_id = data.get('draw_id')
-        
-        if not all([user_id, first_name, draw_id]):
-            return {'success': False, 'message': 'Недостаточно данных'}
-        
         bot_token = os.getenv('BOT_TOKEN')
         supabase_url = os.getenv('SUPABASE_URL')
         supabase_key = os.getenv('SUPABASE_KEY')
@@ -59,30 +222,71 @@ class handler(BaseHTTPRequestHandler):
         if not all([bot_token, supabase_url, supabase_key]):
             return {'success': False, 'message': 'Ошибка конфигурации сервера'}
         
-        supabase = create_client(supabase_url, supabase_key)
+        # Пользователь берется только из подписанной initData: поддельный запрос
+        # отклоняется одной HMAC, до фильтра Блума, Telegram и БД
+        try:
+            init_data = validate_init_data(data.get('init_data'), bot_token, INIT_DATA_MAX_AGE)
+        except InitDataError:
+            return {'success': False, 'message': 'Не удалось подтвердить данные Telegram. Откройте розыгрыш заново'}
         
-        draw_result = supabase.table("draws").select("*").eq("id", draw_id).execute()
+        user = init_data['user'] or {}
+        user_id = user.get('id')
+        first_name = user.get('first_name')
+        username = user.get('username')
+        draw_id = data.get('draw_id')
         
-        if not draw_result.data:
-            return {'success': False, 'message': 'Розыгрыш не найден'}
+        if not all([user_id, first_name, draw_id]):
+            return {'success': False, 'message': 'Недостаточно данных'}
         
-        draw = draw_result.data[0]
+        # «Есть» у фильтра Блума — только «возможно»: вместо проверок в Telegram
+        # и вставки его подтверждает один точный запрос по индексу (draw_id, user_id)
+        if membership_filters.might_contain(draw_id, user_id):
+            started = time.perf_counter()
+            confirmed = _is_participant(supabase_url, supabase_key, str(draw_id), user_id)
+            self._mark('confirm', started)
+            if confirmed:
+                return {
+                    'success': True,
+                    'message': 'Вы уже участвуете в розыгрыше!',
+                    'already_participating': True
+                }
         
-        if draw['status'] != 'active':
+        started = time.perf_counter()
+        draw = _get_draw(supabase_url, supabase_key, str(draw_id))
+        self._mark('draw', started)
+        
+        if draw is None:
+            return {'success': False, 'message': 'Розыгрыш не найден'}
+        
+        # Статус в кэше может отставать до DRAW_CACHE_TTL, а бот захватывает розыгрыш
+        # сразу после end_date: после него регистрация уже не попадет в розыгрыш
+        if draw['status'] != 'active' or parse_end_date(draw['end_date'], TIMEZONE) <= datetime.now(ZoneInfo(TIMEZONE)):
+            membership_filters.drop(draw_id)
             return {'success': False, 'message': 'Розыгрыш завершен'}
         
-        channels = draw['channels']
-        missing_channels = []
+        if membership_filters.get(draw_id) is None:
+            _start_filter_build(supabase_url, supabase_key, draw_id)
+        
+        channels = [channel_info['username'] for channel_info in draw['channels']]
         
-        async with aiohttp.ClientSession() as session:
-            for channel_info in channels:
-                channel_username = channel_info['username']
-                is_subscribed = await self.check_subscription(
-                    session, bot_token, user_id, channel_username
-                )
-                
-                if not is_subscribed:
-                    missing_channels.append(channel_username)
+        # «Проверить снова» нажимают сразу после подписки: запомненный отказ
+        # ответил бы «не подписан» еще до истечения SUBSCRIPTION_CACHE_NEGATIVE_TTL
+        if data.get('retry'):
+            for channel_username in channels:
+                if subscription_cache.get(channel_username, user_id) is False:
+                    subscription_cache.invalidate(channel_username, user_id)
+        
+        # Все каналы проверяются параллельно: UI нужен полный список пропущенных
+        started = time.perf_counter()
+        missing_channels = await gather_failures(
+            lambda channel_username: self.check_subscription(
+                bot_token, user_id, channel_username
+            ),
+            channels,
+            concurrency=CHECK_CONCURRENCY,
+            timeout=CHECK_TIMEOUT
+        )
+        self._mark('checks', started)
         
         if missing_channels:
             return {
@@ -91,51 +295,66 @@ class handler(BaseHTTPRequestHandler):
                 'missing_channels': missing_channels
             }
         
-        participant_result = supabase.table("participants").select("*").eq(
-            "draw_id", draw_id
-        ).eq("user_id", user_id).execute()
-        
-        if participant_result.data:
-            return {
-                'success': True,
-                'message': 'Вы уже участвуете в розыгрыше!',
-                'already_participating': True
-            }
-        
+        # Регистрация за один запрос: INSERT ... ON CONFLICT DO NOTHING
+        started = time.perf_counter()
         try:
-            supabase.table("participants").insert({
+            added = register_participant(supabase_url, supabase_key, {
                 "draw_id": draw_id,
                 "user_id": user_id,
                 "first_name": first_name,
                 "username": username
-            }).execute()
-            
+            })
+        except Exception as e:
+            return {'success': False, 'message': f'Ошибка при регистрации: {str(e)}'}
+        finally:
+            self._mark('insert', started)
+        
+        membership_filters.add(draw_id, user_id)
+        
+        if not added:
             return {
                 'success': True,
-                'message': 'Вы успешно зарегистрированы в розыгрыше!',
-                'already_participating': False
+                'message': 'Вы уже участвуете в розыгрыше!',
+                'already_participating': True
             }
-        except Exception as e:
-            return {'success': False, 'message': f'Ошибка при регистрации: {str(e)}'}
+        
+        return {
+            'success': True,
+            'message': 'Вы успешно зарегистрированы в розыгрыше!',
+            'already_participating': False
+        }
     
     async def check_subscription(
         self,
-        session: aiohttp.ClientSession,
         bot_token: str,
         user_id: int,
         channel_username: str
     ) -> bool:
         """Проверить подписку пользователя на канал"""
-        url = f"https://api.telegram.org/bot{bot_token}/getChatMember"
+        cached = subscription_cache.get(channel_username, user_id)
+        if cached is not None:
+            return cached
+        
+        import aiohttp
+        url = f"{TELEGRAM_API_URL}/bot{bot_token}/getChatMember"
         params = {'chat_id': channel_username, 'user_id': user_id}
         
-        try:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get('ok'):
-                        status = data['result']['status']
-                        return status in ['creator', 'administrator', 'member']
+        for _ in range(2):
+            try:
+                session = await _get_session()
+                async with session.get(url, params=params) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        if data.get('ok'):
+                            status = data['result']['status']
+                            subscribed = status in ['creator', 'administrator', 'member']
+                            subscription_cache.set(channel_username, user_id, subscribed)
+                            return subscribed
+                    return False
+            except (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError):
+                # Соединение из пула умерло, пока инстанс был заморожен:
+                # aiohttp уже выбросил его, повтор откроет новое
+                continue
+            except Exception:
                 return False
-        except Exception:
-            return False
+        return False
@@ -0,0 +1,241 @@
+"""
+Локальные заглушки Telegram Bot API и Supabase REST (PostgREST) для нагрузочных тестов
+"""
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+class FakeTelegram:
+    """Bot API с настраиваемой задержкой и долей ответов 429 (на отправку и правку сообщений).
+
+    Пользователь считается подписанным, если user_id не делится на
+    unsubscribed_every (0 — подписаны все).
+    """
+
+    def __init__(self, latency: float = 0.05, error_rate: float = 0.0, unsubscribed_every: int = 0, bot_id: int = 1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.unsubscribed_every = unsubscribed_every
+        self.bot_id = bot_id
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._message_id = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+    async def _params(self, request: web.Request) -> Dict[str, Any]:
+        params: Dict[str, Any] = dict(request.query)
+        if request.method == "POST":
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+        return params
+
+    def _user(self, user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": user_id == self.bot_id, "first_name": f"user{user_id}"}
+
+    def _chat(self, chat_id: Any) -> Dict[str, Any]:
+        if isinstance(chat_id, str) and chat_id.startswith("@"):
+            return {"id": -1000000000000 - abs(hash(chat_id)) % 10 ** 9, "type": "channel", "username": chat_id[1:]}
+        return {"id": int(chat_id), "type": "private" if int(chat_id) > 0 else "channel"}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = await self._params(request)
+        await asyncio.sleep(self.latency)
+
+        if self.error_rate and method.startswith(("send", "edit")) and random.random() < self.error_rate:
+            self.errors[method] += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1}
+            }, status=429)
+
+        if method == "getMe":
+            result: Any = {**self._user(self.bot_id), "username": "bench_bot"}
+        elif method == "getChat":
+            result = {**self._chat(params["chat_id"]), "accent_color_id": 0, "max_reaction_count": 11}
+        elif method == "getChatMember":
+            user_id = int(params["user_id"])
+            if user_id == self.bot_id:
+                result = {
+                    "status": "administrator", "user": self._user(user_id), "can_be_edited": False,
+                    "is_anonymous": False, "can_manage_chat": True, "can_delete_messages": True,
+                    "can_manage_video_chats": True, "can_restrict_members": True, "can_promote_members": False,
+                    "can_change_info": True, "can_invite_users": True, "can_post_stories": False,
+                    "can_edit_stories": False, "can_delete_stories": False, "can_post_messages": True,
+                    "can_edit_messages": True
+                }
+            elif self.unsubscribed_every and user_id % self.unsubscribed_every == 0:
+                result = {"status": "left", "user": self._user(user_id)}
+            else:
+                result = {"status": "member", "user": self._user(user_id)}
+        elif method in ("sendMessage", "editMessageText"):
+            self._message_id += 1
+            result = {
+                "message_id": int(params.get("message_id") or self._message_id),
+                "date": int(time.time()),
+                "chat": self._chat(params["chat_id"]),
+                "text": params.get("text", "")
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+class FakePostgREST:
+    """Таблицы draws / participants / winners в памяти с подмножеством синтаксиса PostgREST,
+    которое используют bot/utils/db.py и api/*.py"""
+
+    def __init__(self, latency: float = 0.01):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {"draws": [], "participants": [], "winners": []}
+        self.unique = {"participants": ("draw_id", "user_id")}
+        self.calls: Counter = Counter()
+        self._ids: Counter = Counter()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/rest/v1/{table}", self.handle)
+        return app
+
+    def insert_rows(self, table: str, rows: List[Dict[str, Any]]):
+        """Заполнить таблицу напрямую, без HTTP"""
+        for row in rows:
+            self._ids[table] += 1
+            self.tables[table].append({"id": self._ids[table], **row})
+
+    @staticmethod
+    def _match(row: Dict[str, Any], column: str, expression: str) -> bool:
+        operator, _, value = expression.partition(".")
+        actual = row.get(column)
+        if operator == "eq":
+            return str(actual) == value
+        if operator == "neq":
+            return str(actual) != value
+        if operator == "is":
+            return actual is None if value == "null" else str(actual).lower() == value
+        if operator == "in":
+            return str(actual) in value.strip("()").split(",")
+        try:
+            actual_value, expected = float(actual), float(value)
+        except (TypeError, ValueError):
+            actual_value, expected = str(actual), value
+        return {
+            "gt": actual_value > expected,
+            "gte": actual_value >= expected,
+            "lt": actual_value < expected,
+            "lte": actual_value <= expected
+        }.get(operator, True)
+
+    def _filter(self, rows: List[Dict[str, Any]], query) -> List[Dict[str, Any]]:
+        reserved = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+        for column, expression in query.items():
+            if column not in reserved:
+                rows = [row for row in rows if self._match(row, column, expression)]
+        return rows
+
+    @staticmethod
+    def _project(rows: List[Dict[str, Any]], select: Optional[str]) -> List[Dict[str, Any]]:
+        if not select or select == "*":
+            return [dict(row) for row in rows]
+        columns = [column.strip() for column in select.split(",")]
+        return [{column: row.get(column) for column in columns} for row in rows]
+
+    def _response(self, rows: List[Dict[str, Any]], prefer: str, total: Optional[int] = None) -> web.Response:
+        headers = {}
+        if "count=" in prefer:
+            count = len(rows) if total is None else total
+            headers["Content-Range"] = f"0-{max(0, len(rows) - 1)}/{count}"
+        if "return=minimal" in prefer:
+            return web.Response(status=201, headers=headers)
+        return web.json_response(rows, headers=headers)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        table = request.match_info["table"]
+        self.calls[f"{request.method} {table}"] += 1
+        await asyncio.sleep(self.latency)
+        prefer = request.headers.get("Prefer", "")
+        rows = self.tables.setdefault(table, [])
+        query = request.query
+
+        if request.method in ("GET", "HEAD"):
+            matched = self._filter(rows, query)
+            total = len(matched)
+            if "order" in query:
+                column, _, direction = query["order"].partition(".")
+                matched = sorted(matched, key=lambda row: row.get(column), reverse=direction.startswith("desc"))
+            if "limit" in query:
+                matched = matched[int(query.get("offset", 0)):][:int(query["limit"])]
+            if request.method == "HEAD":
+                return self._response([], prefer + ",return=minimal", total)
+            return self._response(self._project(matched, query.get("select")), prefer, total)
+
+        if request.method == "POST":
+            body = await request.json()
+            new_rows = body if isinstance(body, list) else [body]
+            unique = tuple(query["on_conflict"].split(",")) if "on_conflict" in query else self.unique.get(table)
+            inserted = []
+            for new_row in new_rows:
+                if unique:
+                    key = tuple(str(new_row.get(column)) for column in unique)
+                    existing = next((row for row in rows if tuple(str(row.get(column)) for column in unique) == key), None)
+                    if existing is not None:
+                        if "resolution=ignore-duplicates" in prefer:
+                            continue
+                        if "resolution=merge-duplicates" in prefer:
+                            existing.update(new_row)
+                            inserted.append(existing)
+                            continue
+                        return web.json_response({
+                            "code": "23505",
+                            "message": "duplicate key value violates unique constraint",
+                            "details": None,
+                            "hint": None
+                        }, status=409)
+                self._ids[table] += 1
+                row = {"id": self._ids[table], **new_row}
+                if table == "draws":
+                    row["id"] = str(row["id"])
+                rows.append(row)
+                inserted.append(row)
+            return self._response(inserted, prefer)
+
+        if request.method == "PATCH":
+            changes = await request.json()
+            matched = self._filter(rows, query)
+            for row in matched:
+                row.update(changes)
+            return self._response([dict(row) for row in matched], prefer)
+
+        if request.method == "DELETE":
+            matched = self._filter(rows, query)
+            for row in matched:
+                rows.remove(row)
+            return self._response(matched, prefer)
+
+        return web.Response(status=405)
+
+
+async def start_app(app: web.Application, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def dump_calls(counter: Counter) -> Dict[str, int]:
+    return dict(sorted(counter.items()))
+
@@ -0,0 +1,122 @@
+"""
+Время импорта модулей на холодном старте (python -X importtime).
+
+    python -m bench.importtime api.verify bot.main --repeat 5
+    python -m bench.importtime api.verify --max-ms 300
+
+Каждый модуль импортируется в отдельном свежем интерпретаторе repeat раз;
+в отчет попадают медианы: общее время, самые дорогие модули (собственное
+и накопленное время) и тяжелые зависимости, загруженные при импорте.
+С --max-ms прогон завершается с кодом 1, если медиана превысила порог.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+from bench.run import BOT_TOKEN, SUPABASE_KEY, git_revision
+
+DEFAULT_TARGETS = ["api.verify", "api.ping", "bot.utils.db", "bot.main"]
+# Зависимости, которые не должны попадать в холодный старт serverless-функций без нужды
+HEAVY_MODULES = ["aiogram", "supabase", "httpx", "aiohttp", "apscheduler", "postgrest"]
+
+
+def parse_importtime(stderr: str, target: str) -> Dict[str, Dict[str, int]]:
+    """{модуль: {"self": мкс, "cumulative": мкс, "depth": вложенность}} для импорта target.
+
+    -X importtime печатает модули после их зависимостей, поэтому поддерево
+    target — строки от предыдущего импорта верхнего уровня до самого target;
+    site и прочий запуск интерпретатора в отчет не попадают.
+    """
+    modules: Dict[str, Dict[str, int]] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        if depth == 0 and stripped != target:
+            modules = {}
+            continue
+        modules[stripped] = {"self": self_us, "cumulative": cumulative_us, "depth": depth}
+        if stripped == target:
+            break
+    return modules
+
+
+def measure(target: str) -> Dict[str, Dict[str, int]]:
+    env = dict(os.environ)
+    # Настройки бота читаются при импорте; адреса не используются, сеть не нужна
+    env.setdefault("BOT_TOKEN", BOT_TOKEN)
+    env.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+    env.setdefault("SUPABASE_KEY", SUPABASE_KEY)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True, text=True, env=env
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {target} завершился с ошибкой:\n{completed.stderr[-2000:]}")
+    return parse_importtime(completed.stderr, target)
+
+
+def report(target: str, repeat: int, top: int) -> Dict[str, Any]:
+    runs = [measure(target) for _ in range(repeat)]
+    names = set(runs[0]).intersection(*runs[1:])
+
+    def median(name: str, field: str) -> float:
+        return round(statistics.median(run[name][field] for run in runs) / 1000, 2)
+
+    by_self = sorted(names, key=lambda name: median(name, "self"), reverse=True)[:top]
+    by_cumulative = sorted(
+        (name for name in names if name != target),
+        key=lambda name: median(name, "cumulative"),
+        reverse=True
+    )[:top]
+    return {
+        "total_ms": median(target, "cumulative"),
+        "modules": len(runs[0]),
+        "heavy": sorted(name for name in HEAVY_MODULES if name in names),
+        "top_self_ms": {name: median(name, "self") for name in by_self},
+        "top_cumulative_ms": {name: median(name, "cumulative") for name in by_cumulative}
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Время импорта модулей на холодном старте")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("--repeat", type=int, default=5, help="запусков на модуль, в отчете медиана")
+    parser.add_argument("--top", type=int, default=15, help="сколько самых дорогих модулей показать")
+    parser.add_argument("--max-ms", type=float, help="порог общего времени импорта для каждого модуля")
+    parser.add_argument("--output", default="bench-importtime.json")
+    return parser.parse_args(argv)
+
+
+def main(args) -> int:
+    results = {target: report(target, max(1, args.repeat), args.top) for target in args.targets}
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"revision": git_revision(), "python": sys.version.split()[0], "targets": results},
+                  file, ensure_ascii=False, indent=2)
+
+    failed: List[str] = []
+    for target, result in results.items():
+        print(f"{target}: {result['total_ms']:.1f} мс, модулей {result['modules']}, "
+              f"тяжелые зависимости: {', '.join(result['heavy']) or 'нет'}")
+        for name, duration in list(result["top_cumulative_ms"].items())[:5]:
+            print(f"    {duration:8.1f} мс  {name}")
+        if args.max_ms is not None and result["total_ms"] > args.max_ms:
+            failed.append(target)
+    if failed:
+        print(f"Превышен порог {args.max_ms} мс: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,305 @@
+"""
+Нагрузочный прогон: регистрация через api/verify и завершение розыгрышей планировщиком
+на локальных заглушках Telegram и Supabase.
+
+    python -m bench.run verify --requests 2000 --concurrency 50 --workers 4
+    python -m bench.run complete --draws 20 --participants 50000
+
+Результат (пропускная способность, перцентили задержки, число вызовов API)
+пишется в JSON, чтобы сравнивать прогоны до и после изменений.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from zoneinfo import ZoneInfo
+
+import aiohttp
+
+from bench.fakes import FakePostgREST, FakeTelegram, dump_calls, start_app
+from bot.utils.webapp import sign_init_data
+
+BOT_TOKEN = "123456:bench"
+# Ключ в формате JWT: supabase-py проверяет его вид при создании клиента
+SUPABASE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 и максимум в миллисекундах"""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "max": round(ordered[-1] * 1000, 2)}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def configure_env(telegram_url: str, supabase_url: str):
+    """Окружение нужно выставить до импорта модулей бота: настройки читаются при импорте"""
+    os.environ.update({
+        "BOT_TOKEN": BOT_TOKEN,
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_KEY": SUPABASE_KEY,
+        "TELEGRAM_API_URL": telegram_url
+    })
+
+
+def serve_verify(port: int, telegram_url: str, supabase_url: str):
+    """Один инстанс функции: однопоточный HTTP-сервер, как на Vercel"""
+    configure_env(telegram_url, supabase_url)
+    from http.server import HTTPServer
+    from api.verify import handler
+
+    handler.log_message = lambda *args: None
+    logging.disable(logging.INFO)
+    HTTPServer(("127.0.0.1", port), handler).serve_forever()
+
+
+def seed_draws(
+    postgrest: FakePostgREST,
+    draws: int,
+    participants: int,
+    channels: int,
+    winners: int,
+    ends_in: timedelta = timedelta(minutes=-1)
+) -> List[str]:
+    # end_date хранится без смещения, в часовом поясе бота
+    now = datetime.now(ZoneInfo(os.getenv("TIMEZONE", "Europe/Moscow"))).replace(tzinfo=None, microsecond=0)
+    end_date = (now + ends_in).isoformat()
+    draw_ids = []
+    for index in range(draws):
+        postgrest.insert_rows("draws", [{
+            "title": f"Bench {index}",
+            "description": "",
+            "prizes": "Приз",
+            "winners_count": winners,
+            "channels": [{"username": f"@bench_{index}_{channel}"} for channel in range(channels)],
+            "end_date": end_date,
+            "status": "active",
+            "owner_id": 42
+        }])
+        draw_id = postgrest.tables["draws"][-1]["id"] = str(postgrest.tables["draws"][-1]["id"])
+        postgrest.insert_rows("participants", [
+            {"draw_id": draw_id, "user_id": 1000 + user, "first_name": f"user{user}", "username": None}
+            for user in range(participants)
+        ])
+        draw_ids.append(draw_id)
+    return draw_ids
+
+
+async def run_verify(args, telegram: FakeTelegram, postgrest: FakePostgREST, telegram_url: str, supabase_url: str):
+    # Регистрация открыта до end_date
+    draw_ids = seed_draws(postgrest, args.draws, 0, args.channels, 1, ends_in=timedelta(hours=1))
+
+    ports = [free_port() for _ in range(args.workers)]
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=serve_verify, args=(port, telegram_url, supabase_url), daemon=True)
+        for port in ports
+    ]
+    for process in processes:
+        process.start()
+
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {}
+    # Часть запросов — повторные нажатия уже зарегистрированных пользователей
+    users = [1000 + index for index in range(max(1, int(args.requests * (1 - args.repeat_ratio))))]
+    # Доля запросов — с поддельной подписью initData
+    requests = [
+        (random.choice(draw_ids), random.choice(users), random.random() < args.forged_ratio)
+        for _ in range(args.requests)
+    ]
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in requests:
+        queue.put_nowait(item)
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+        # Дождаться, пока инстансы начнут принимать соединения
+        for port in ports:
+            for _ in range(100):
+                try:
+                    async with session.options(f"http://127.0.0.1:{port}/"):
+                        break
+                except aiohttp.ClientError:
+                    await asyncio.sleep(0.1)
+
+        telegram.calls.clear()
+        postgrest.calls.clear()
+
+        async def client(number: int):
+            url = f"http://127.0.0.1:{ports[number % len(ports)]}/"
+            while not queue.empty():
+                draw_id, user_id, forged = queue.get_nowait()
+                init_data = sign_init_data({
+                    "auth_date": int(time.time()),
+                    "user": {"id": user_id, "first_name": f"user{user_id}"}
+                }, "654321:forged" if forged else BOT_TOKEN)
+                started = time.perf_counter()
+                try:
+                    async with session.post(url, json={"init_data": init_data, "draw_id": draw_id}) as response:
+                        body = await response.json() if response.status == 200 else {}
+                    if body.get("already_participating"):
+                        outcome = "already"
+                    elif body.get("success"):
+                        outcome = "registered"
+                    elif body.get("missing_channels"):
+                        outcome = "not_subscribed"
+                    elif forged:
+                        outcome = "rejected"
+                    else:
+                        outcome = f"error_{response.status}"
+                except aiohttp.ClientError:
+                    outcome = "connection_error"
+                latencies.append(time.perf_counter() - started)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(number) for number in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    for process in processes:
+        process.terminate()
+        process.join()
+
+    return {
+        "requests": len(latencies),
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 2),
+        "latency_ms": percentiles(latencies),
+        "outcomes": outcomes
+    }
+
+
+async def run_complete(args, telegram: FakeTelegram, postgrest: FakePostgREST, telegram_url: str, supabase_url: str):
+    configure_env(telegram_url, supabase_url)
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.enums import ParseMode
+
+    from bot.config import RATE_LIMIT_GLOBAL, RATE_LIMIT_PRIVATE, RATE_LIMIT_GROUP_PER_MINUTE
+    from bot.middlewares import RateLimitMiddleware, RateLimiter, TelegramMetricsMiddleware
+    from bot.utils.channels import channel_registry
+    from bot.utils.db import db
+    from bot.utils.scheduler import DrawScheduler
+
+    draw_ids = seed_draws(postgrest, args.draws, args.participants, args.channels, args.winners)
+
+    bot = Bot(
+        token=BOT_TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(telegram_url)),
+        default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
+    )
+    bot.session.middleware(RateLimitMiddleware(RateLimiter(
+        global_rate=RATE_LIMIT_GLOBAL,
+        private_rate=RATE_LIMIT_PRIVATE,
+        group_rate=RATE_LIMIT_GROUP_PER_MINUTE / 60
+    )))
+    bot.session.middleware(TelegramMetricsMiddleware())
+    await channel_registry.setup(bot)
+    telegram.calls.clear()
+    postgrest.calls.clear()
+
+    draw_scheduler = DrawScheduler(bot)
+    started = time.perf_counter()
+    await asyncio.gather(*(draw_scheduler.complete_draw_by_id(draw_id) for draw_id in draw_ids))
+    elapsed = time.perf_counter() - started
+
+    await bot.session.close()
+    db.close()
+
+    completed = [draw for draw in postgrest.tables["draws"] if draw["status"] == "completed"]
+    latencies = [seconds for _, seconds in draw_scheduler.latencies]
+    return {
+        "draws": len(draw_ids),
+        "completed": len(completed),
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(completed) / elapsed, 2),
+        "participants_per_second": round(len(completed) * args.participants / elapsed, 2),
+        "latency_ms": percentiles(latencies)
+    }
+
+
+async def main(args) -> Dict[str, Any]:
+    telegram = FakeTelegram(latency=args.telegram_latency, error_rate=args.telegram_429_rate, unsubscribed_every=10)
+    postgrest = FakePostgREST(latency=args.db_latency)
+    telegram_port, supabase_port = free_port(), free_port()
+    runners = [
+        await start_app(telegram.app(), port=telegram_port),
+        await start_app(postgrest.app(), port=supabase_port)
+    ]
+    telegram_url = f"http://127.0.0.1:{telegram_port}"
+    supabase_url = f"http://127.0.0.1:{supabase_port}"
+
+    try:
+        scenario = run_verify if args.scenario == "verify" else run_complete
+        result = await scenario(args, telegram, postgrest, telegram_url, supabase_url)
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+    return {
+        "scenario": args.scenario,
+        "revision": git_revision(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("scenario", "output")},
+        "result": result,
+        "telegram_calls": dump_calls(telegram.calls),
+        "telegram_429": dump_calls(telegram.errors),
+        "db_calls": dump_calls(postgrest.calls)
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон на заглушках Telegram и Supabase")
+    parser.add_argument("scenario", choices=["verify", "complete"])
+    parser.add_argument("--requests", type=int, default=1000, help="verify: число запросов")
+    parser.add_argument("--concurrency", type=int, default=50, help="verify: одновременных клиентов")
+    parser.add_argument("--workers", type=int, default=4, help="verify: инстансов функции")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="verify: доля повторных нажатий")
+    parser.add_argument("--forged-ratio", type=float, default=0.0, help="verify: доля запросов с поддельной initData")
+    parser.add_argument("--draws", type=int, default=5)
+    parser.add_argument("--participants", type=int, default=10000, help="complete: участников в розыгрыше")
+    parser.add_argument("--winners", type=int, default=10, help="complete: победителей в розыгрыше")
+    parser.add_argument("--channels", type=int, default=3, help="каналов в условиях розыгрыша")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="секунды на вызов Bot API")
+    parser.add_argument("--telegram-429-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--db-latency", type=float, default=0.01, help="секунды на запрос к PostgREST")
+    parser.add_argument("--output", default="bench-result.json")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    arguments = parse_args()
+    report = asyncio.run(main(arguments))
+    with open(arguments.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    print()
@@ -15,3 +15,94 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 WEBAPP_URL = getenv("WEBAPP_URL", "https://your-project.vercel.app/webapp")
 TIMEZONE = getenv("TIMEZONE", "Europe/Moscow")
 DATE_FORMAT = "%d.%m.%Y %H:%M"
+
+# Пул потоков для запросов к Supabase и таймаут одного запроса (сек)
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", "10"))
+DB_TIMEOUT = float(getenv("DB_TIMEOUT", "10"))
+
+# Кэш результатов getChatMember: размер и TTL (сек) для подписан / не подписан
+SUBSCRIPTION_CACHE_SIZE = int(getenv("SUBSCRIPTION_CACHE_SIZE", "10000"))
+SUBSCRIPTION_CACHE_TTL = float(getenv("SUBSCRIPTION_CACHE_TTL", "300"))
+SUBSCRIPTION_CACHE_NEGATIVE_TTL = float(getenv("SUBSCRIPTION_CACHE_NEGATIVE_TTL", "10"))
+
+# Параллельная проверка подписок: максимум одновременных запросов и таймаут одного (сек)
+CHECK_CONCURRENCY = int(getenv("CHECK_CONCURRENCY", "5"))
+CHECK_TIMEOUT = float(getenv("CHECK_TIMEOUT", "5"))
+
+# Планировщик загружает из БД розыгрыши, которые закончатся в ближайшие N часов
+SCHEDULER_HORIZON_HOURS = float(getenv("SCHEDULER_HORIZON_HOURS", "24"))
+
+# Размер страницы при потоковом чтении участников
+PARTICIPANTS_PAGE_SIZE = int(getenv("PARTICIPANTS_PAGE_SIZE", "1000"))
+
+# Сколько розыгрышей завершается одновременно и через сколько секунд повторить неудачное завершение
+COMPLETION_WORKERS = int(getenv("COMPLETION_WORKERS", "4"))
+COMPLETION_RETRY_DELAY = float(getenv("COMPLETION_RETRY_DELAY", "60"))
+
+# Несколько реплик бота: идентификатор реплики (по умолчанию хост-pid-случайный суффикс),
+# период heartbeat и срок аренды (сек), после которого розыгрыши упавшей реплики переходят к другим
+REPLICA_ID = getenv("REPLICA_ID")
+HEARTBEAT_INTERVAL = float(getenv("HEARTBEAT_INTERVAL", "10"))
+LEASE_TTL = float(getenv("LEASE_TTL", "30"))
+
+# Повторная проверка подписок победителей: запас кандидатов на замену (доля),
+# запросов getChatMember в секунду, одновременно проверяемых кандидатов и предельное время выбора (сек)
+WINNER_RESERVE_RATIO = float(getenv("WINNER_RESERVE_RATIO", "0.2"))
+WINNER_CHECK_RATE = float(getenv("WINNER_CHECK_RATE", "20"))
+WINNER_CHECK_CONCURRENCY = int(getenv("WINNER_CHECK_CONCURRENCY", "10"))
+WINNER_CHECK_TIMEOUT = float(getenv("WINNER_CHECK_TIMEOUT", "60"))
+
+# Лимиты исходящих сообщений: всего в секунду, в личный чат в секунду, в группу/канал в минуту
+RATE_LIMIT_GLOBAL = float(getenv("RATE_LIMIT_GLOBAL", "30"))
+RATE_LIMIT_PRIVATE = float(getenv("RATE_LIMIT_PRIVATE", "1"))
+RATE_LIMIT_GROUP_PER_MINUTE = float(getenv("RATE_LIMIT_GROUP_PER_MINUTE", "20"))
+
+# Фильтр Блума «уже участвует»: участников на фильтр, доля ложных срабатываний,
+# число розыгрышей в памяти, время жизни фильтра (сек) и сколько строк читать при построении
+MEMBERSHIP_FILTER_CAPACITY = int(getenv("MEMBERSHIP_FILTER_CAPACITY", "100000"))
+MEMBERSHIP_FILTER_ERROR_RATE = float(getenv("MEMBERSHIP_FILTER_ERROR_RATE", "0.001"))
+MEMBERSHIP_FILTER_MAX_DRAWS = int(getenv("MEMBERSHIP_FILTER_MAX_DRAWS", "50"))
+MEMBERSHIP_FILTER_TTL = float(getenv("MEMBERSHIP_FILTER_TTL", "600"))
+MEMBERSHIP_FILTER_BUILD_LIMIT = int(getenv("MEMBERSHIP_FILTER_BUILD_LIMIT", "20000"))
+
+# Как часто (сек) обновлять счетчик участников на постах розыгрышей (0 — не обновлять)
+COUNTER_INTERVAL = float(getenv("COUNTER_INTERVAL", "30"))
+# Каждое N-е обновление читает точное число участников, остальные — оценку PostgREST
+# (count=estimated: точно для небольших розыгрышей, по статистике планировщика для больших)
+COUNTER_EXACT_EVERY = int(getenv("COUNTER_EXACT_EVERY", "10"))
+
+# Кэш метаданных розыгрышей: размер, TTL (сек) для найденных и для несуществующих draw_id
+DRAW_CACHE_SIZE = int(getenv("DRAW_CACHE_SIZE", "1000"))
+DRAW_CACHE_TTL = float(getenv("DRAW_CACHE_TTL", "30"))
+DRAW_CACHE_NEGATIVE_TTL = float(getenv("DRAW_CACHE_NEGATIVE_TTL", "300"))
+
+# Хранилище FSM: memory, sqlite (файл FSM_SQLITE_PATH) или redis (REDIS_URL);
+# FSM_TTL — через сколько секунд без изменений брошенный мастер забывается.
+# Локально вместо общего Redis: docker run -d -p 6379:6379 redis:7 и FSM_STORAGE=redis
+# (REDIS_URL по умолчанию указывает на localhost:6379)
+FSM_STORAGE = getenv("FSM_STORAGE", "sqlite")
+FSM_SQLITE_PATH = getenv("FSM_SQLITE_PATH", "fsm.sqlite3")
+REDIS_URL = getenv("REDIS_URL", "redis://localhost:6379/0")
+FSM_TTL = float(getenv("FSM_TTL", "86400"))
+
+# Режим приема апдейтов: polling или webhook
+BOT_MODE = getenv("BOT_MODE", "polling")
+WEBHOOK_URL = getenv("WEBHOOK_URL")
+WEBHOOK_PATH = getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_WORKERS = int(getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE_SIZE = int(getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+if BOT_MODE == "webhook" and (not WEBHOOK_URL or not WEBHOOK_SECRET):
+    raise ValueError("WEBHOOK_URL или WEBHOOK_SECRET не установлены")
+
+# Метрики Prometheus: адрес HTTP-эндпоинта /metrics (METRICS_PORT=0 — не запускать)
+METRICS_HOST = getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(getenv("METRICS_PORT", "9100"))
+
+# Апдейты дольше SLOW_UPDATE_THRESHOLD секунд логируются с разбивкой времени (0 — без замеров)
+SLOW_UPDATE_THRESHOLD = float(getenv("SLOW_UPDATE_THRESHOLD", "1"))
+# Сэмплирующий профилировщик включается, если задан PROFILER_PATH (файл collapsed-стеков)
+PROFILER_PATH = getenv("PROFILER_PATH")
+PROFILER_INTERVAL = float(getenv("PROFILER_INTERVAL", "0.01"))
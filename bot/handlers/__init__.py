@@ -1,4 +1,5 @@
 ﻿from . import start
 from . import create_draw
+from . import channels
 
-__all__ = ["start", "create_draw"]
+__all__ = ["start", "create_draw", "channels"]
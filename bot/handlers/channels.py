@@ -0,0 +1,19 @@
+"""
+Обновление реестра каналов по апдейтам my_chat_member
+"""
+from aiogram import Router
+from aiogram.types import ChatMemberUpdated
+
+from bot.utils.channels import channel_registry
+from bot.utils.checks import subscription_cache
+
+router = Router()
+
+@router.my_chat_member()
+async def on_my_chat_member(update: ChatMemberUpdated):
+    """Бота добавили, повысили, понизили или удалили из чата"""
+    info = channel_registry.update(update.chat, update.new_chat_member)
+    
+    if not info.is_admin:
+        # Без прав администратора подписки в этом канале больше не проверить
+        subscription_cache.invalidate(info.username or update.chat.id)
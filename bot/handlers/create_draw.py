@@ -12,6 +12,9 @@ from aiogram.types import Message, CallbackQuery
 
 from bot.utils.db import db
 from bot.utils.checks import check_channel_requirements
+from bot.utils.channels import channel_registry
+from bot.utils.counter import participant_counter
+from bot.utils.scheduler import schedule_draw
 from bot.keyboards.inline import (
     get_conditions_keyboard,
     get_retry_keyboard,
@@ -128,7 +131,7 @@ async def process_channel(message: Message, state: FSMContext, bot: Bot):
     checking_msg = await message.answer("⏳ Проверяю канал...")
     
     user_subscribed, bot_is_admin = await check_channel_requirements(
-        bot, message.from_user.id, channel_username
+        bot, message.from_user.id, channel_username, refresh=True
     )
     
     if not user_subscribed:
@@ -182,8 +185,9 @@ async def retry_channel_check(callback: CallbackQuery, state: FSMContext, bot: B
     
     checking_msg = await callback.message.edit_text("⏳ Проверяю канал снова...")
     
+    # Пользователь только что подписался: запомненный отказ не должен отвечать за Telegram
     user_subscribed, bot_is_admin = await check_channel_requirements(
-        bot, callback.from_user.id, channel_username
+        bot, callback.from_user.id, channel_username, refresh=True, use_cache=False
     )
     
     if not user_subscribed:
@@ -264,7 +268,8 @@ async def process_end_date(message: Message, state: FSMContext):
             )
             return
         
-        await state.update_data(end_date=end_date)
+        # В хранилище FSM данные сериализуются в JSON
+        await state.update_data(end_date=end_date.isoformat())
         await state.set_state(CreateDrawForm.confirming)
         
         # Показать итоговое сообщение
@@ -291,7 +296,7 @@ def format_draw_message(data: Dict[str, Any]) -> str:
     prizes = data["prizes"]
     winners_count = data["winners_count"]
     channels = data["channels"]
-    end_date = data["end_date"]
+    end_date = datetime.fromisoformat(data["end_date"])
     
     text = f"🎉 **{title}**\n\n"
     text += f"🎁 **Призы:**\n{prizes}\n\n"
@@ -305,12 +310,21 @@ def format_draw_message(data: Dict[str, Any]) -> str:
     
     return text
 
+def format_channel_post(draw: Dict[str, Any], participants: int = 0) -> str:
+    """Текст поста розыгрыша в канале со счетчиком участников"""
+    return (
+        format_draw_message(draw)
+        + f"\n👥 **Участников:** {participants}"
+        + "\n\n👇 Нажмите кнопку ниже чтобы участвовать"
+    )
+
 @router.callback_query(F.data == "confirm_create", CreateDrawForm.confirming)
 async def confirm_create(callback: CallbackQuery, state: FSMContext, bot: Bot):
     """Подтверждение создания розыгрыша"""
     await callback.answer()
     
     data = await state.get_data()
+    end_date = datetime.fromisoformat(data["end_date"])
     
     # Создать розыгрыш в БД
     draw_id = await db.create_draw(
@@ -319,26 +333,35 @@ async def confirm_create(callback: CallbackQuery, state: FSMContext, bot: Bot):
         prizes=data["prizes"],
         winners_count=data["winners_count"],
         channels=data["channels"],
-        end_date=data["end_date"]
+        end_date=end_date
     )
+    schedule_draw(draw_id, end_date)
     
     # Отправить сообщение в первый канал
     first_channel = data["channels"][0]["username"]
-    draw_text = format_draw_message(data) + "\n\n👇 Нажмите кнопку ниже чтобы участвовать"
+    draw_text = format_channel_post(data)
     
     try:
+        channel_info = await channel_registry.get(bot, first_channel)
+        if channel_info is not None and not channel_info.can_post_messages:
+            raise PermissionError("у бота нет права публикации сообщений")
+        
         sent_message = await bot.send_message(
-            chat_id=first_channel,
+            chat_id=channel_info.chat_id if channel_info else first_channel,
             text=draw_text,
             reply_markup=get_participate_keyboard(draw_id),
             parse_mode="Markdown"
         )
         
+        # Пост запоминается, чтобы обновлять на нем число участников
+        await db.set_draw_message(draw_id, sent_message.message_id)
+        participant_counter.track({**data, "id": draw_id}, sent_message.chat.id, sent_message.message_id, rendered=draw_text)
+        
         await callback.message.answer(
             f"✅ **Розыгрыш успешно создан!**\n\n"
             f"ID розыгрыша: `{draw_id}`\n"
             f"Опубликовано в: {first_channel}\n\n"
-            f"Розыгрыш завершится автоматически {data['end_date'].strftime('%d.%m.%Y в %H:%M')}",
+            f"Розыгрыш завершится автоматически {end_date.strftime('%d.%m.%Y в %H:%M')}",
             parse_mode="Markdown"
         )
         
@@ -7,11 +7,27 @@ import sys
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from bot.config import BOT_TOKEN
-from bot.handlers import start, create_draw
+from bot.config import (
+    BOT_TOKEN, RATE_LIMIT_GLOBAL, RATE_LIMIT_PRIVATE, RATE_LIMIT_GROUP_PER_MINUTE,
+    FSM_STORAGE, FSM_SQLITE_PATH, REDIS_URL, FSM_TTL, METRICS_HOST, METRICS_PORT,
+    SLOW_UPDATE_THRESHOLD, PROFILER_PATH, PROFILER_INTERVAL, COUNTER_INTERVAL,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE
+)
+from bot.handlers import start, create_draw, channels
+from bot.keyboards.inline import get_participate_keyboard
+from bot.middlewares import (
+    FSMMetricsMiddleware, HandlerNameMiddleware, RateLimitMiddleware, RateLimiter, TelegramMetricsMiddleware,
+    UpdateTimingMiddleware
+)
+from bot.utils.db import db
+from bot.utils.channels import channel_registry
+from bot.utils.counter import participant_counter
+from bot.utils.metrics import start_metrics_server
+from bot.utils.profiler import SamplingProfiler
+from bot.utils.storage import create_storage
 from bot.utils.scheduler import init_scheduler
+from bot.webhook import run_webhook
 
 # Настройка логирования
 logging.basicConfig(
@@ -29,27 +45,80 @@ async def main():
         default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
     )
     
+    # Все исходящие сообщения проходят через общий ограничитель скорости
+    rate_limiter = RateLimiter(
+        global_rate=RATE_LIMIT_GLOBAL,
+        private_rate=RATE_LIMIT_PRIVATE,
+        group_rate=RATE_LIMIT_GROUP_PER_MINUTE / 60
+    )
+    bot.session.middleware(RateLimitMiddleware(rate_limiter))
+    # Внутренний middleware: меряет каждый фактический запрос, без ожидания лимита
+    bot.session.middleware(TelegramMetricsMiddleware())
+    
     # Инициализация диспетчера с хранилищем состояний
-    storage = MemoryStorage()
+    storage = create_storage(FSM_STORAGE, FSM_SQLITE_PATH, REDIS_URL, FSM_TTL)
     dp = Dispatcher(storage=storage)
+    dp.message.outer_middleware(FSMMetricsMiddleware())
+    dp.callback_query.outer_middleware(FSMMetricsMiddleware())
+    if SLOW_UPDATE_THRESHOLD > 0:
+        # Трасса открывается после FSM-middleware диспетчера, хендлер известен после фильтров
+        dp.update.outer_middleware(UpdateTimingMiddleware(SLOW_UPDATE_THRESHOLD))
+        dp.message.middleware(HandlerNameMiddleware())
+        dp.callback_query.middleware(HandlerNameMiddleware())
     
     # Регистрация роутеров
     dp.include_router(start.router)
     dp.include_router(create_draw.router)
+    dp.include_router(channels.router)
+    
+    # Профиль бота запрашивается один раз, дальше берется из реестра
+    await channel_registry.setup(bot)
     
     # Инициализация и запуск планировщика
     scheduler = init_scheduler(bot)
     scheduler.start()
     
+    # Счетчик участников на постах розыгрышей
+    if COUNTER_INTERVAL > 0:
+        await participant_counter.start(
+            bot, create_draw.format_channel_post, get_participate_keyboard, owns=scheduler.coordinator.owns
+        )
+    
+    metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+    
+    profiler = SamplingProfiler(PROFILER_PATH, PROFILER_INTERVAL) if PROFILER_PATH else None
+    if profiler is not None:
+        profiler.start()
+    
     logger.info("Бот запущен")
     
     try:
-        # Запуск polling
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if BOT_MODE == "webhook":
+            await run_webhook(
+                dp, bot,
+                url=WEBHOOK_URL,
+                path=WEBHOOK_PATH,
+                secret=WEBHOOK_SECRET,
+                host=WEBHOOK_HOST,
+                port=WEBHOOK_PORT,
+                workers=WEBHOOK_WORKERS,
+                queue_size=WEBHOOK_QUEUE_SIZE
+            )
+        else:
+            # Запуск polling
+            await bot.delete_webhook()
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
         # Остановка планировщика при завершении
-        scheduler.stop()
+        await scheduler.stop()
+        await participant_counter.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if profiler is not None:
+            profiler.stop()
         await bot.session.close()
+        await storage.close()
+        db.close()
         logger.info("Бот остановлен")
 
 if __name__ == "__main__":
@@ -0,0 +1,12 @@
+from .rate_limit import RateLimitMiddleware, RateLimiter
+from .metrics import FSMMetricsMiddleware, TelegramMetricsMiddleware
+from .timing import HandlerNameMiddleware, UpdateTimingMiddleware
+
+__all__ = [
+    "RateLimitMiddleware",
+    "RateLimiter",
+    "FSMMetricsMiddleware",
+    "TelegramMetricsMiddleware",
+    "HandlerNameMiddleware",
+    "UpdateTimingMiddleware",
+]
@@ -0,0 +1,83 @@
+"""
+Метрики запросов к Telegram (middleware сессии) и шагов FSM (middleware диспетчера)
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramBadRequest, TelegramConflictError, TelegramEntityTooLarge, TelegramForbiddenError,
+    TelegramNetworkError, TelegramNotFound, TelegramRetryAfter, TelegramServerError, TelegramUnauthorizedError
+)
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from bot.utils.metrics import fsm_step_seconds, telegram_errors_total, telegram_request_seconds
+from bot.utils.tracing import record
+
+# Код ошибки для метки: HTTP-статус ответа Bot API или вид сбоя
+ERROR_CODES = (
+    (TelegramRetryAfter, "429"),
+    (TelegramBadRequest, "400"),
+    (TelegramUnauthorizedError, "401"),
+    (TelegramForbiddenError, "403"),
+    (TelegramNotFound, "404"),
+    (TelegramConflictError, "409"),
+    (TelegramEntityTooLarge, "413"),
+    (TelegramServerError, "5xx"),
+    (TelegramNetworkError, "network"),
+)
+
+
+def error_code(error: Exception) -> str:
+    for error_type, code in ERROR_CODES:
+        if isinstance(error, error_type):
+            return code
+    return "api" if isinstance(error, TelegramAPIError) else type(error).__name__
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Время каждого запроса к Bot API и ошибки по методам.
+
+    Подключается после RateLimitMiddleware, поэтому ожидание лимита не
+    входит в латентность, а повторы после 429 считаются отдельно.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            telegram_errors_total.inc(name, error_code(e))
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            telegram_request_seconds.observe(elapsed, name)
+            record("telegram", elapsed)
+
+
+class FSMMetricsMiddleware(BaseMiddleware):
+    """Длительность обработки апдейтов, пришедших в состоянии FSM (шаги мастера)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        state = data.get("raw_state")
+        if state is None:
+            return await handler(event, data)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            fsm_step_seconds.observe(time.perf_counter() - started, state)
@@ -0,0 +1,184 @@
+"""
+Ограничение исходящих запросов к Telegram (middleware сессии бота)
+"""
+import asyncio
+import heapq
+import logging
+import time
+from itertools import count
+from typing import Dict, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from bot.utils.metrics import rate_limit_queue_depth
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: ответы пользователям раньше массовых публикаций в каналы
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Лимитируются только методы, отправляющие или меняющие сообщения
+LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до следующего токена"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(0.0, self.paused_until - now) + wait
+
+    def reserve(self, now: float) -> float:
+        """Занять токен (возможно, в долг) и вернуть время ожидания"""
+        wait = self.delay(now)
+        self.tokens -= 1
+        return wait
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+
+class RateLimiter:
+    """Общий лимит (~30 сообщений/с) и лимиты на чат.
+
+    Ожидающие общего токена запросы выходят из очереди по приоритету,
+    внутри приоритета — в порядке поступления.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        private_rate: float = 1,
+        group_rate: float = 20 / 60,
+        private_burst: float = 5,
+        max_chats: int = 10000
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.private_burst = private_burst
+        self.max_chats = max_chats
+        self._chats: Dict[str, TokenBucket] = {}
+        self._queue: list = []
+        self._seq = count()
+        self._pump_task = None
+        self._waiting = 0
+        rate_limit_queue_depth.set_function(lambda: self.queue_depth)
+
+    @property
+    def queue_depth(self) -> int:
+        """Число запросов, ожидающих отправки"""
+        return self._waiting
+
+    @staticmethod
+    def is_private(chat_id: Union[int, str]) -> bool:
+        return isinstance(chat_id, int) and chat_id > 0
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        key = str(chat_id).lower()
+        bucket = self._chats.get(key)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                now = time.monotonic()
+                for idle_key in [k for k, b in self._chats.items() if b.is_idle(now)]:
+                    del self._chats[idle_key]
+            if self.is_private(chat_id):
+                # В личке короткие пачки (ответ + редактирование) не ограничиваются
+                bucket = TokenBucket(self.private_rate, self.private_burst)
+            else:
+                # Группам и каналам разрешена небольшая пачка, дальше ~20 сообщений в минуту
+                bucket = TokenBucket(self.group_rate, 3)
+            self._chats[key] = bucket
+        return bucket
+
+    async def acquire(self, chat_id: Union[int, str, None], priority: int):
+        self._waiting += 1
+        try:
+            if chat_id is not None:
+                wait = self._chat_bucket(chat_id).reserve(time.monotonic())
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (priority, next(self._seq), future))
+            if self._pump_task is None or self._pump_task.done():
+                self._pump_task = asyncio.create_task(self._pump())
+            await future
+        finally:
+            self._waiting -= 1
+
+    async def _pump(self):
+        """Выдавать общие токены ожидающим в порядке приоритета"""
+        while self._queue:
+            wait = self.global_bucket.delay(time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                # Ожидающий запрос отменен
+                continue
+            self.global_bucket.reserve(time.monotonic())
+            future.set_result(None)
+
+    def pause(self, chat_id: Union[int, str, None], seconds: float):
+        """Приостановить отправку в чат (или всю отправку) после 429"""
+        if chat_id is None:
+            self.global_bucket.pause(seconds)
+        else:
+            self._chat_bucket(chat_id).pause(seconds)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Пропускает отправку сообщений через RateLimiter и повторяет запрос после TelegramRetryAfter"""
+
+    def __init__(self, limiter: RateLimiter, max_retries: int = 3):
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if not type(method).__name__.startswith(LIMITED_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        priority = PRIORITY_INTERACTIVE if RateLimiter.is_private(chat_id) else PRIORITY_BULK
+
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(
+                    f"Flood control для {type(method).__name__} в чате {chat_id}: "
+                    f"повтор через {e.retry_after} с"
+                )
+                self.limiter.pause(chat_id, e.retry_after)
@@ -0,0 +1,72 @@
+"""
+Время обработки апдейтов по хендлерам и состояниям FSM, лог медленных апдейтов
+"""
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from bot.utils.metrics import handler_seconds
+from bot.utils.tracing import Trace, current_trace
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateTimingMiddleware(BaseMiddleware):
+    """Outer middleware апдейтов: открывает трассу и по завершении пишет метрику.
+
+    Апдейт дольше threshold секунд попадает в лог с разбивкой времени на
+    Telegram, БД и собственный код. Регистрируется после FSM-middleware
+    диспетчера, поэтому состояние уже известно.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        trace = Trace()
+        token = current_trace.set(trace)
+        try:
+            return await handler(event, data)
+        finally:
+            current_trace.reset(token)
+            breakdown = trace.breakdown()
+            state = data.get("raw_state") or ""
+            handler_name = trace.handler or f"unhandled:{event.event_type}"
+            handler_seconds.observe(breakdown["total"] / 1000, handler_name, state)
+
+            if breakdown["total"] >= self.threshold * 1000:
+                timings = " ".join(f"{kind}={ms:.1f}ms" for kind, ms in breakdown.items())
+                calls = " ".join(f"{kind}_calls={count}" for kind, count in trace.calls.items())
+                logger.warning(
+                    f"Медленный апдейт {event.update_id}: handler={handler_name} state={state or '-'} {timings} {calls}",
+                    extra={
+                        "update_id": event.update_id,
+                        "handler": handler_name,
+                        "state": state,
+                        "timings": breakdown,
+                        "calls": dict(trace.calls)
+                    }
+                )
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner middleware: сообщает трассе, какой хендлер выбран фильтрами"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        trace = current_trace.get()
+        if trace is not None:
+            callback = data["handler"].callback
+            trace.handler = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+        return await handler(event, data)
@@ -1,5 +1,24 @@
-﻿from .db import db
-from .checks import check_user_subscription, check_bot_admin, check_all_channels
-from .scheduler import init_scheduler
+﻿"""
+Пакет утилит. Тяжелые модули (supabase, aiogram, apscheduler) импортируются
+при первом обращении к имени, чтобы api/* не тянули их вместе с bot.utils.cache
+"""
+import importlib
 
-__all__ = ["db", "check_user_subscription", "check_bot_admin", "check_all_channels", "init_scheduler"]
+_EXPORTS = {
+    "db": ".db",
+    "check_user_subscription": ".checks",
+    "check_bot_admin": ".checks",
+    "check_all_channels": ".checks",
+    "init_scheduler": ".scheduler",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,127 @@
+"""
+Объявление итогов розыгрыша: разбиение на сообщения в пределах лимита Telegram
+"""
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+logger = logging.getLogger(__name__)
+
+# Лимит длины текста сообщения; Telegram считает его в кодовых единицах UTF-16
+MESSAGE_LIMIT = 4096
+
+MARKDOWN_SPECIAL = str.maketrans({char: f"\\{char}" for char in "_*`["})
+
+
+def text_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram (эмодзи — две единицы)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def escape_markdown(text: Any) -> str:
+    """Экранировать пользовательский текст для parse_mode=Markdown"""
+    return str(text).translate(MARKDOWN_SPECIAL)
+
+
+def _split_long(piece: str, limit: int) -> List[str]:
+    """Разрезать строку длиннее лимита, не отрывая экранирующий обратный слэш"""
+    parts = []
+    current = ""
+    current_length = 0
+    for char in piece:
+        char_length = 2 if ord(char) > 0xFFFF else 1
+        if current_length + char_length > limit:
+            cut = len(current) - 1 if current.endswith("\\") else len(current)
+            parts.append(current[:cut])
+            current = current[cut:]
+            current_length = text_length(current)
+        current += char
+        current_length += char_length
+    if current:
+        parts.append(current)
+    return parts
+
+
+def build_chunks(lines: Iterable[str], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Собрать строки в сообщения за один проход.
+
+    Строки не разрываются между сообщениями (кроме строк длиннее лимита),
+    поэтому ссылки и экранирование Markdown остаются целыми.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_length = 0
+    for line in lines:
+        for piece in _split_long(line, limit) if text_length(line) > limit else (line,):
+            piece_length = text_length(piece)
+            # +1 за перевод строки перед piece
+            if current and current_length + 1 + piece_length > limit:
+                chunks.append("\n".join(current))
+                current, current_length = [], 0
+            current_length += piece_length + (1 if current else 0)
+            current.append(piece)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def winner_line(position: int, winner: Dict[str, Any]) -> str:
+    username = winner.get("username")
+    if username:
+        # Внутри ссылки экранирование не работает: квадратные скобки просто убираются
+        name = str(winner["first_name"]).replace("[", "").replace("]", "")
+        return f"{position}. [{name}](https://t.me/{username})"
+    return f"{position}. {escape_markdown(winner['first_name'])}"
+
+
+def winners_announcement(draw: Dict[str, Any], winners: List[Dict[str, Any]], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Сообщения с итогами розыгрыша в порядке отправки"""
+    lines = [
+        # Внутри *...* экранирование не работает, поэтому пользовательский текст вне выделения
+        f"🏆 Розыгрыш \"{escape_markdown(draw['title'])}\" *завершен!*",
+        "",
+        "🎁 *Призы:*",
+        escape_markdown(draw["prizes"]),
+        "",
+        "🎉 *Победители:*",
+        ""
+    ]
+    lines.extend(winner_line(position, winner) for position, winner in enumerate(winners, 1))
+    lines.extend(["", "🎊 Поздравляем победителей!"])
+    return build_chunks(lines, limit)
+
+
+def no_participants_announcement(draw: Dict[str, Any]) -> List[str]:
+    return [
+        f"🎉 Розыгрыш \"{escape_markdown(draw['title'])}\" завершен!\n\n"
+        f"❌ К сожалению, не было участников."
+    ]
+
+
+async def send_chunks(
+    bot: Bot,
+    chat_id: Union[int, str],
+    chunks: List[str],
+    start: int = 0,
+    on_sent: Optional[Callable[[int], Awaitable[None]]] = None
+):
+    """Отправить сообщения по порядку, начиная с chunks[start].
+
+    on_sent(index) вызывается после каждой доставленной части, чтобы
+    сохранить прогресс: при повторе отправка продолжится с первой
+    неотправленной части. Сообщения идут последовательно — иначе
+    Telegram не гарантирует их порядок в канале.
+    """
+    for index in range(start, len(chunks)):
+        try:
+            await bot.send_message(chat_id=chat_id, text=chunks[index], parse_mode="Markdown")
+        except TelegramBadRequest as e:
+            if "can't parse entities" not in str(e):
+                raise
+            # Разметка не разобралась — лучше объявить итоги без форматирования, чем не объявить
+            logger.warning(f"Часть {index + 1}/{len(chunks)} отправлена без разметки: {e}")
+            await bot.send_message(chat_id=chat_id, text=chunks[index], parse_mode=None)
+        if on_sent is not None:
+            await on_sent(index)
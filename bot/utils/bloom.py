@@ -0,0 +1,85 @@
+"""
+Вероятностный фильтр «уже участвует» для розыгрышей
+"""
+import hashlib
+import math
+from typing import Iterable, Optional
+
+from bot.utils.cache import TTLCache
+
+
+class BloomFilter:
+    """Фильтр Блума: «нет» — точно, «есть» — с вероятностью ошибки error_rate.
+
+    Пока добавлено не больше capacity элементов, вероятность ложного
+    «есть» не превышает error_rate; после этого фильтр считается
+    переполненным.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(str(item).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        is_new = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                is_new = True
+        if is_new:
+            self.count += 1
+
+    def __contains__(self, item) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def saturated(self) -> bool:
+        return self.count > self.capacity
+
+
+class MembershipFilters:
+    """Фильтры участников по розыгрышам.
+
+    Хранится не больше max_draws фильтров (LRU), каждый живет ttl секунд,
+    поэтому память ограничена, а фильтр завершенного розыгрыша исчезает
+    даже без явного drop.
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001, max_draws: int = 50, ttl: float = 600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.ttl = ttl
+        self._filters = TTLCache(max_draws)
+
+    def create(self, draw_id: str, user_ids: Iterable[int] = ()) -> BloomFilter:
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        for user_id in user_ids:
+            bloom.add(int(user_id))
+        self._filters.set(str(draw_id), bloom, self.ttl)
+        return bloom
+
+    def get(self, draw_id: str) -> Optional[BloomFilter]:
+        return self._filters.get(str(draw_id))
+
+    def might_contain(self, draw_id: str, user_id: int) -> bool:
+        """True — пользователь, возможно, участвует (подтвердить точным запросом); False — фильтр не поможет"""
+        bloom = self.get(draw_id)
+        return bloom is not None and not bloom.saturated and int(user_id) in bloom
+
+    def add(self, draw_id: str, user_id: int):
+        bloom = self.get(draw_id)
+        if bloom is not None:
+            bloom.add(int(user_id))
+
+    def drop(self, draw_id: str):
+        self._filters.delete(str(draw_id))
@@ -0,0 +1,105 @@
+"""
+Кэши результатов проверок (общие для бота и serverless-функций)
+"""
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class CacheBackend(ABC):
+    """Интерфейс хранилища для кэшей: get / set с TTL / delete"""
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any, ttl: float):
+        ...
+
+    @abstractmethod
+    def delete(self, key: Hashable):
+        ...
+
+    @abstractmethod
+    def delete_where(self, predicate):
+        """Удалить все ключи, для которых predicate(key) истинно"""
+
+
+class TTLCache(CacheBackend):
+    """In-process LRU-кэш с ограниченным размером и временем жизни записей"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        for key in [k for k in self._data if predicate(k)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SubscriptionCache:
+    """Кэш результатов getChatMember по ключу (канал, user_id).
+
+    Положительные и отрицательные ответы живут разное время: отписку мы
+    готовы заметить с задержкой, а подписку пользователь ждет сразу.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        positive_ttl: float = 300,
+        negative_ttl: float = 10,
+        maxsize: int = 10000
+    ):
+        self.backend = backend if backend is not None else TTLCache(maxsize)
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+
+    @staticmethod
+    def _key(channel: str, user_id: int) -> tuple:
+        return (str(channel).lower(), int(user_id))
+
+    def get(self, channel: str, user_id: int) -> Optional[bool]:
+        """True/False из кэша или None, если нужно спросить Telegram"""
+        return self.backend.get(self._key(channel, user_id))
+
+    def set(self, channel: str, user_id: int, subscribed: bool):
+        ttl = self.positive_ttl if subscribed else self.negative_ttl
+        if ttl > 0:
+            self.backend.set(self._key(channel, user_id), subscribed, ttl)
+
+    def invalidate(self, channel: str, user_id: Optional[int] = None):
+        """Сбросить запись пользователя или все записи канала"""
+        if user_id is not None:
+            self.backend.delete(self._key(channel, user_id))
+            return
+        channel_key = str(channel).lower()
+        self.backend.delete_where(lambda key: key[0] == channel_key)
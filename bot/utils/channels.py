@@ -0,0 +1,92 @@
+"""
+Реестр каналов: идентификатор бота и его права в известных каналах
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import Chat, ChatMember, User
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ChannelInfo:
+    """Разрешенный канал и статус бота в нем"""
+    chat_id: int
+    username: Optional[str]
+    status: str
+    can_post_messages: bool = False
+    can_edit_messages: bool = False
+
+    @property
+    def is_admin(self) -> bool:
+        return self.status in ['creator', 'administrator']
+
+class ChannelRegistry:
+    """Кэш get_me и прав бота в каналах.
+
+    Записи обновляются из апдейтов my_chat_member, поэтому повторные
+    проверки известных каналов не обращаются к Bot API.
+    """
+
+    def __init__(self):
+        self.me: Optional[User] = None
+        self._channels: Dict[str, ChannelInfo] = {}
+
+    @staticmethod
+    def _key(channel: Union[str, int]) -> str:
+        return str(channel).lower()
+
+    async def setup(self, bot: Bot):
+        """Один раз запросить собственный профиль бота"""
+        self.me = await bot.get_me()
+        logger.info(f"Бот @{self.me.username} (id {self.me.id})")
+
+    async def get_bot_id(self, bot: Bot) -> int:
+        if self.me is None:
+            await self.setup(bot)
+        return self.me.id
+
+    def _store(self, chat: Chat, member: ChatMember) -> ChannelInfo:
+        status = str(member.status.value if hasattr(member.status, 'value') else member.status)
+        info = ChannelInfo(
+            chat_id=chat.id,
+            username=f"@{chat.username}" if chat.username else None,
+            status=status,
+            can_post_messages=status == 'creator' or (status == 'administrator' and member.can_post_messages is not False),
+            can_edit_messages=status == 'creator' or (status == 'administrator' and member.can_edit_messages is not False)
+        )
+        self._channels[self._key(chat.id)] = info
+        if info.username:
+            self._channels[self._key(info.username)] = info
+        return info
+
+    async def get(self, bot: Bot, channel: Union[str, int], refresh_non_admin: bool = False) -> Optional[ChannelInfo]:
+        """Информация о канале из реестра; неизвестный канал запрашивается один раз.
+
+        refresh_non_admin перезапрашивает запись, в которой бот не администратор:
+        my_chat_member о назначении мог прийти в другой процесс (webhook, реплики).
+        """
+        info = self._channels.get(self._key(channel))
+        if info is not None and (info.is_admin or not refresh_non_admin):
+            return info
+        try:
+            chat = await bot.get_chat(chat_id=channel)
+            member = await bot.get_chat_member(chat_id=chat.id, user_id=await self.get_bot_id(bot))
+        except TelegramAPIError:
+            return None
+        return self._store(chat, member)
+
+    def update(self, chat: Chat, member: ChatMember) -> ChannelInfo:
+        """Обновить запись по апдейту my_chat_member"""
+        info = self._store(chat, member)
+        logger.info(f"Статус бота в чате {info.username or info.chat_id}: {info.status}")
+        return info
+
+    async def resolve_chat_id(self, bot: Bot, channel: Union[str, int]) -> Union[str, int]:
+        """chat_id канала для отправки сообщений (или исходное значение, если канал не разрешился)"""
+        info = await self.get(bot, channel)
+        return info.chat_id if info else channel
+
+channel_registry = ChannelRegistry()
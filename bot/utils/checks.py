@@ -1,31 +1,59 @@
-﻿from typing import List, Tuple
+﻿from typing import List, Optional, Tuple
 from aiogram import Bot
 from aiogram.exceptions import TelegramAPIError
 
-async def check_user_subscription(bot: Bot, user_id: int, channel_username: str) -> bool:
+from bot.config import SUBSCRIPTION_CACHE_SIZE, SUBSCRIPTION_CACHE_TTL, SUBSCRIPTION_CACHE_NEGATIVE_TTL, CHECK_CONCURRENCY, CHECK_TIMEOUT
+from bot.utils.cache import SubscriptionCache
+from bot.utils.channels import channel_registry
+from bot.utils.concurrency import gather_failures
+
+subscription_cache = SubscriptionCache(positive_ttl=SUBSCRIPTION_CACHE_TTL, negative_ttl=SUBSCRIPTION_CACHE_NEGATIVE_TTL, maxsize=SUBSCRIPTION_CACHE_SIZE)
+
+async def check_user_subscription(bot: Bot, user_id: int, channel_username: str, use_cache: bool = True) -> bool:
+    if use_cache:
+        cached = subscription_cache.get(channel_username, user_id)
+        if cached is not None:
+            return cached
     try:
         member = await bot.get_chat_member(chat_id=channel_username, user_id=user_id)
-        return member.status in ['creator', 'administrator', 'member']
     except TelegramAPIError:
         return False
+    subscribed = member.status in ['creator', 'administrator', 'member']
+    subscription_cache.set(channel_username, user_id, subscribed)
+    return subscribed
 
-async def check_bot_admin(bot: Bot, channel_username: str) -> bool:
+async def verify_membership(bot: Bot, user_id: int, channel_username: str) -> Optional[bool]:
+    """Подписка без кэша: False — точно не подписан, None — проверить не удалось"""
     try:
-        bot_info = await bot.get_me()
-        member = await bot.get_chat_member(chat_id=channel_username, user_id=bot_info.id)
-        return member.status in ['creator', 'administrator']
+        member = await bot.get_chat_member(chat_id=channel_username, user_id=user_id)
     except TelegramAPIError:
-        return False
+        return None
+    if member.status == 'restricted':
+        # Ограниченный пользователь остается в канале, только пока is_member
+        return bool(member.is_member)
+    return member.status not in ['left', 'kicked']
+
+async def check_bot_admin(bot: Bot, channel_username: str, refresh: bool = False) -> bool:
+    # refresh: запись «не администратор» перезапрашивается — это путь повторной проверки, он редкий
+    info = await channel_registry.get(bot, channel_username, refresh_non_admin=refresh)
+    return info is not None and info.is_admin
 
-async def check_channel_requirements(bot: Bot, user_id: int, channel_username: str) -> Tuple[bool, bool]:
-    user_subscribed = await check_user_subscription(bot, user_id, channel_username)
-    bot_is_admin = await check_bot_admin(bot, channel_username)
+async def check_channel_requirements(bot: Bot, user_id: int, channel_username: str, refresh: bool = False, use_cache: bool = True) -> Tuple[bool, bool]:
+    user_subscribed = await check_user_subscription(bot, user_id, channel_username, use_cache=use_cache)
+    bot_is_admin = await check_bot_admin(bot, channel_username, refresh=refresh)
     return user_subscribed, bot_is_admin
 
-async def check_all_channels(bot: Bot, user_id: int, channels: List[str]) -> Tuple[bool, List[str]]:
-    missing_channels = []
-    for channel in channels:
-        subscribed = await check_user_subscription(bot, user_id, channel)
-        if not subscribed:
-            missing_channels.append(channel)
+async def check_all_channels(bot: Bot, user_id: int, channels: List[str], fail_fast: bool = False, use_cache: bool = True) -> Tuple[bool, List[str]]:
+    """Проверить подписку на все каналы параллельно.
+
+    С fail_fast проверка останавливается на первом канале без подписки,
+    и список пропущенных каналов может быть неполным.
+    """
+    missing_channels = await gather_failures(
+        lambda channel: check_user_subscription(bot, user_id, channel, use_cache=use_cache),
+        channels,
+        concurrency=CHECK_CONCURRENCY,
+        timeout=CHECK_TIMEOUT,
+        fail_fast=fail_fast
+    )
     return len(missing_channels) == 0, missing_channels
@@ -0,0 +1,50 @@
+"""
+Параллельный запуск проверок с ограничением конкурентности
+"""
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+async def gather_failures(
+    check: Callable[[T], Awaitable[bool]],
+    items: Sequence[T],
+    concurrency: int = 5,
+    timeout: Optional[float] = None,
+    fail_fast: bool = False
+) -> List[T]:
+    """Запустить check для всех items и вернуть те, что не прошли проверку.
+
+    Одновременно выполняется не больше concurrency проверок, каждая
+    ограничена timeout; таймаут и исключение считаются непройденной
+    проверкой. С fail_fast остальные проверки отменяются после первой
+    неудачи — достаточно, когда нужен только ответ да/нет.
+    Порядок результата совпадает с порядком items.
+    """
+    if not items:
+        return []
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index: int, item: T):
+        async with semaphore:
+            try:
+                return index, await asyncio.wait_for(check(item), timeout)
+            except Exception:
+                return index, False
+
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+    failed = []
+    try:
+        for future in asyncio.as_completed(tasks):
+            index, passed = await future
+            if not passed:
+                failed.append(index)
+                if fail_fast:
+                    break
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return [items[index] for index in sorted(failed)]
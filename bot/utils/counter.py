@@ -0,0 +1,144 @@
+"""
+Счетчик участников на опубликованном посте розыгрыша
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup
+
+from bot.config import COUNTER_INTERVAL, COUNTER_EXACT_EVERY
+from bot.utils.channels import channel_registry
+from bot.utils.db import db
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TrackedPost:
+    draw: Dict[str, Any]
+    chat_id: Union[int, str]
+    message_id: int
+    count: int = 0
+    # Текст, который сейчас показан в канале
+    rendered: Optional[str] = None
+    refreshes: int = 0
+
+
+class ParticipantCounter:
+    """Число участников на посте розыгрыша: не больше одной правки за interval секунд на розыгрыш"""
+
+    def __init__(self, interval: float = 30, exact_every: int = 10):
+        self.interval = interval
+        self.exact_every = max(1, exact_every)
+        self.bot: Optional[Bot] = None
+        self.render: Optional[Callable[[Dict[str, Any], int], str]] = None
+        self.keyboard: Optional[Callable[[str], InlineKeyboardMarkup]] = None
+        self.owns: Callable[[str], bool] = lambda draw_id: True
+        self.posts: Dict[str, TrackedPost] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(
+        self,
+        bot: Bot,
+        render: Callable[[Dict[str, Any], int], str],
+        keyboard: Callable[[str], InlineKeyboardMarkup],
+        owns: Optional[Callable[[str], bool]] = None
+    ):
+        """Запустить обновление постов; owns(draw_id) — обновляет ли пост эта реплика"""
+        self.bot = bot
+        self.render = render
+        self.keyboard = keyboard
+        if owns is not None:
+            self.owns = owns
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def track(self, draw: Dict[str, Any], chat_id: Union[int, str], message_id: int, rendered: Optional[str] = None):
+        """Начать отслеживать пост; rendered — текст, с которым он опубликован"""
+        self.posts[str(draw["id"])] = TrackedPost(draw, chat_id, message_id, rendered=rendered)
+
+    def untrack(self, draw_id: str):
+        self.posts.pop(str(draw_id), None)
+
+    async def sync(self):
+        """Сверить посты с активными розыгрышами: подхватить новые (и с других реплик), забыть завершенные"""
+        active = {str(post["id"]): post["message_id"] for post in await db.get_active_posts()}
+        for draw_id in list(self.posts):
+            if draw_id not in active:
+                self.untrack(draw_id)
+        # Полные строки читаются только для постов, которых еще нет в списке
+        new_ids = [draw_id for draw_id, message_id in active.items() if message_id and draw_id not in self.posts]
+        if not new_ids:
+            return
+        for draw in await db.get_draws(new_ids):
+            draw_id = str(draw["id"])
+            try:
+                chat_id = await channel_registry.resolve_chat_id(self.bot, draw["channels"][0]["username"])
+            except Exception as e:
+                logger.warning(f"Не удалось определить канал розыгрыша {draw_id}: {e}")
+                continue
+            self.track(draw, chat_id, draw["message_id"])
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Ошибка сверки счетчиков участников: {e}")
+            for draw_id in list(self.posts):
+                # При нескольких репликах пост обновляет только владелец розыгрыша
+                if not self.owns(draw_id):
+                    continue
+                try:
+                    await self.refresh(draw_id)
+                except Exception as e:
+                    logger.error(f"Ошибка обновления счетчика розыгрыша {draw_id}: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self, draw_id: str):
+        """Сверить счетчик с БД и отредактировать пост, если текст изменился"""
+        post = self.posts.get(draw_id)
+        if post is None:
+            return
+        # Точный count по сотням тысяч строк — полный проход по индексу, поэтому
+        # между редкими точными чтениями берется оценка; счетчик на посте не убывает от ее шума
+        exact = post.refreshes % self.exact_every == 0
+        post.refreshes += 1
+        if exact:
+            post.count = await db.count_participants(draw_id)
+        else:
+            post.count = max(post.count, await db.count_participants(draw_id, count='estimated'))
+
+        text = self.render(post.draw, post.count)
+        if text == post.rendered:
+            return
+        try:
+            await self.bot.edit_message_text(
+                text=text,
+                chat_id=post.chat_id,
+                message_id=post.message_id,
+                # Без reply_markup Telegram уберет кнопку участия
+                reply_markup=self.keyboard(draw_id),
+                parse_mode="Markdown"
+            )
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                pass
+            elif "message to edit not found" in str(e):
+                # Пост удален из канала
+                self.untrack(draw_id)
+                return
+            else:
+                raise
+        post.rendered = text
+
+
+participant_counter = ParticipantCounter(COUNTER_INTERVAL, COUNTER_EXACT_EVERY)
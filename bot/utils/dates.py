@@ -0,0 +1,16 @@
+"""
+Даты окончания розыгрышей: хранятся без смещения, в часовом поясе бота
+"""
+from datetime import datetime
+from typing import Union
+from zoneinfo import ZoneInfo
+
+
+def parse_end_date(value: Union[str, datetime], timezone: str) -> datetime:
+    """Дата окончания в часовом поясе timezone.
+
+    Дата хранится так, как ее ввел владелец розыгрыша, поэтому смещение,
+    добавленное базой, отбрасывается.
+    """
+    end_date = datetime.fromisoformat(value) if isinstance(value, str) else value
+    return end_date.replace(tzinfo=ZoneInfo(timezone))
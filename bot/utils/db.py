@@ -1,46 +1,213 @@
-﻿from typing import List, Dict, Any, Optional
-from datetime import datetime
-from supabase import create_client, Client
-from bot.config import SUPABASE_URL, SUPABASE_KEY
+﻿from typing import List, Dict, Any, Optional, AsyncIterator, TYPE_CHECKING
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from bot.config import (
+    SUPABASE_URL, SUPABASE_KEY, DB_POOL_SIZE, DB_TIMEOUT, PARTICIPANTS_PAGE_SIZE,
+    MEMBERSHIP_FILTER_CAPACITY, MEMBERSHIP_FILTER_ERROR_RATE, MEMBERSHIP_FILTER_MAX_DRAWS, MEMBERSHIP_FILTER_TTL, MEMBERSHIP_FILTER_BUILD_LIMIT,
+    DRAW_CACHE_SIZE, DRAW_CACHE_TTL, DRAW_CACHE_NEGATIVE_TTL
+)
+from bot.utils.bloom import MembershipFilters
+from bot.utils.cache import TTLCache
+from bot.utils.metrics import db_errors_total, db_query_seconds
+from bot.utils.rest import is_malformed_id, select_draw_meta, select_participant, select_participants_page, upsert_participant
+from bot.utils.tracing import record
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 class Database:
-    def __init__(self):
-        self.client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    """Запросы к Supabase выполняются в ограниченном пуле потоков, не блокируя event loop"""
+
+    def __init__(self, pool_size: int = DB_POOL_SIZE, timeout: float = DB_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._client: Optional["Client"] = None
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='db')
+        self.draw_cache = TTLCache(DRAW_CACHE_SIZE)
+        self.membership_filters = MembershipFilters(MEMBERSHIP_FILTER_CAPACITY, MEMBERSHIP_FILTER_ERROR_RATE, MEMBERSHIP_FILTER_MAX_DRAWS, MEMBERSHIP_FILTER_TTL)
+        self._filter_builds: Dict[str, asyncio.Task] = {}
+
+    @property
+    def client(self) -> "Client":
+        # supabase и httpx импортируются и клиент создается при первом запросе, а не при импорте модуля
+        if self._client is None:
+            from supabase import create_client
+            from supabase.lib.client_options import ClientOptions
+            self._client = create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(postgrest_client_timeout=self.timeout))
+        return self._client
+
+    async def _execute(self, query, method: str):
+        # method — метка метрик db_query_seconds/db_errors_total
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self._executor, query.execute), self.timeout)
+        except Exception as e:
+            db_errors_total.inc(method, type(e).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            db_query_seconds.observe(elapsed, method)
+            record("db", elapsed)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
     
     async def create_draw(self, owner_id: int, title: str, prizes: str, winners_count: int, channels: List[Dict[str, Any]], end_date: datetime, message_id: Optional[int] = None) -> str:
-        result = self.client.table('draws').insert({'owner_id': owner_id, 'title': title, 'prizes': prizes, 'winners_count': winners_count, 'channels': channels, 'end_date': end_date.isoformat(), 'message_id': message_id, 'status': 'active'}).execute()
+        result = await self._execute(self.client.table('draws').insert({'owner_id': owner_id, 'title': title, 'prizes': prizes, 'winners_count': winners_count, 'channels': channels, 'end_date': end_date.isoformat(), 'message_id': message_id, 'status': 'active'}), 'create_draw')
         return result.data[0]['id']
     
+    async def set_draw_message(self, draw_id: str, message_id: int):
+        await self._execute(self.client.table('draws').update({'message_id': message_id}).eq('id', draw_id), 'set_draw_message')
+    
     async def get_draw(self, draw_id: str) -> Optional[Dict[str, Any]]:
-        result = self.client.table('draws').select('*').eq('id', draw_id).execute()
-        return result.data[0] if result.data else None
+        # Read-through кэш: пустой dict — запомненный несуществующий draw_id
+        cached = self.draw_cache.get(draw_id)
+        if cached is not None:
+            return cached or None
+        try:
+            result = await self._execute(select_draw_meta(self.client, draw_id), 'get_draw')
+            draw = result.data[0] if result.data else None
+        except Exception as e:
+            if not is_malformed_id(e):
+                raise
+            draw = None
+        self.draw_cache.set(draw_id, draw or {}, DRAW_CACHE_TTL if draw else DRAW_CACHE_NEGATIVE_TTL)
+        return draw
     
     async def get_active_draws(self) -> List[Dict[str, Any]]:
-        result = self.client.table('draws').select('*').eq('status', 'active').execute()
+        result = await self._execute(self.client.table('draws').select('*').eq('status', 'active'), 'get_active_draws')
+        return result.data
+    
+    async def get_active_posts(self) -> List[Dict[str, Any]]:
+        # Только id и message_id: сверка счетчиков идет каждые COUNTER_INTERVAL секунд
+        result = await self._execute(self.client.table('draws').select('id, message_id').eq('status', 'active'), 'get_active_posts')
+        return result.data
+    
+    async def get_draws(self, draw_ids: List[str]) -> List[Dict[str, Any]]:
+        result = await self._execute(self.client.table('draws').select('*').in_('id', draw_ids), 'get_draws')
+        return result.data
+    
+    async def get_due_draws(self, before: Optional[datetime] = None, columns: str = 'id, end_date') -> List[Dict[str, Any]]:
+        query = self.client.table('draws').select(columns).eq('status', 'active')
+        if before is not None:
+            query = query.lte('end_date', before.isoformat())
+        result = await self._execute(query.order('end_date'), 'get_due_draws')
         return result.data
     
     async def update_draw_status(self, draw_id: str, status: str):
-        self.client.table('draws').update({'status': status}).eq('id', draw_id).execute()
+        await self._execute(self.client.table('draws').update({'status': status}).eq('id', draw_id), 'update_draw_status')
+        self.draw_cache.delete(draw_id)
+    
+    async def claim_draw(self, draw_id: str, replica_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        # Условный переход active -> completing: строку получит только один исполнитель
+        claim = {'status': 'completing', 'claimed_by': replica_id, 'claimed_at': datetime.now(timezone.utc).isoformat()}
+        result = await self._execute(self.client.table('draws').update(claim).eq('id', draw_id).eq('status', 'active'), 'claim_draw')
+        self.draw_cache.delete(draw_id)
+        return result.data[0] if result.data else None
+    
+    async def get_claimed_draws(self) -> List[Dict[str, Any]]:
+        result = await self._execute(self.client.table('draws').select('*').eq('status', 'completing'), 'get_claimed_draws')
+        return result.data
+    
+    async def take_over_draw(self, draw: Dict[str, Any], replica_id: str) -> Optional[Dict[str, Any]]:
+        # Перехват у упавшей реплики: условие на прежнего владельца, поэтому перехватит только одна
+        query = self.client.table('draws').update({'claimed_by': replica_id, 'claimed_at': datetime.now(timezone.utc).isoformat()}).eq('id', draw['id']).eq('status', 'completing')
+        query = query.eq('claimed_by', draw['claimed_by']) if draw.get('claimed_by') else query.is_('claimed_by', 'null')
+        result = await self._execute(query, 'take_over_draw')
+        return result.data[0] if result.data else None
+    
+    async def heartbeat(self, replica_id: str, at: datetime):
+        await self._execute(self.client.table('scheduler_replicas').upsert({'replica_id': replica_id, 'heartbeat_at': at.isoformat()}, on_conflict='replica_id'), 'heartbeat')
+    
+    async def get_live_replicas(self, since: datetime) -> List[str]:
+        result = await self._execute(self.client.table('scheduler_replicas').select('replica_id').gt('heartbeat_at', since.isoformat()), 'get_live_replicas')
+        return [row['replica_id'] for row in result.data]
+    
+    async def remove_replica(self, replica_id: str):
+        await self._execute(self.client.table('scheduler_replicas').delete().eq('replica_id', replica_id), 'remove_replica')
+    
+    async def remove_stale_replicas(self, before: datetime):
+        await self._execute(self.client.table('scheduler_replicas').delete().lte('heartbeat_at', before.isoformat()), 'remove_stale_replicas')
+    
+    async def set_announced_chunks(self, draw_id: str, count: int):
+        # Прогресс объявления итогов: при повторе отправка продолжается с части count
+        await self._execute(self.client.table('draws').update({'announced_chunks': count}).eq('id', draw_id), 'set_announced_chunks')
+    
+    async def release_draw(self, draw_id: str):
+        await self._execute(self.client.table('draws').update({'status': 'active', 'claimed_by': None}).eq('id', draw_id).eq('status', 'completing'), 'release_draw')
+        self.draw_cache.delete(draw_id)
+    
+    async def register_participant(self, draw_id: str, user_id: int, first_name: str, username: Optional[str] = None) -> bool:
+        result = await self._execute(upsert_participant(self.client, {'draw_id': draw_id, 'user_id': user_id, 'first_name': first_name, 'username': username}), 'register_participant')
+        return bool(result.data)
+    
+    async def build_membership_filter(self, draw_id: str, limit: int = MEMBERSHIP_FILTER_BUILD_LIMIT):
+        # Неполный фильтр тоже корректен: «нет» всегда перепроверяется вставкой
+        bloom = self.membership_filters.create(draw_id)
+        async for row in self.iter_participants(draw_id, columns='id, user_id'):
+            bloom.add(int(row['user_id']))
+            if bloom.count >= limit:
+                break
+    
+    async def is_participant(self, draw_id: str, user_id: int) -> bool:
+        result = await self._execute(select_participant(self.client, draw_id, user_id), 'is_participant')
+        return bool(result.data)
+    
+    def _start_filter_build(self, draw_id: str):
+        # Фильтр строится в фоне: текущий запрос все равно делает точную вставку
+        if draw_id in self._filter_builds:
+            return
+        task = asyncio.create_task(self.build_membership_filter(draw_id))
+        self._filter_builds[draw_id] = task
+        
+        def done(task: asyncio.Task):
+            self._filter_builds.pop(draw_id, None)
+            if task.cancelled() or task.exception() is not None:
+                # Недостроенный фильтр перестроится при следующей регистрации
+                self.membership_filters.drop(draw_id)
+        
+        task.add_done_callback(done)
     
     async def add_participant(self, draw_id: str, user_id: int, first_name: str, username: Optional[str] = None) -> bool:
-        try:
-            self.client.table('participants').insert({'draw_id': draw_id, 'user_id': user_id, 'first_name': first_name, 'username': username}).execute()
-            return True
-        except Exception as e:
-            if 'duplicate' in str(e).lower() or 'unique' in str(e).lower():
-                return False
-            raise
+        if self.membership_filters.get(draw_id) is None:
+            self._start_filter_build(draw_id)
+        # «Есть» у фильтра Блума — только «возможно»: подтверждается одним точным запросом
+        if self.membership_filters.might_contain(draw_id, user_id) and await self.is_participant(draw_id, user_id):
+            return False
+        added = await self.register_participant(draw_id, user_id, first_name, username)
+        self.membership_filters.add(draw_id, user_id)
+        return added
+    
+    async def count_participants(self, draw_id: str, count: str = 'exact') -> int:
+        # Число строк из Content-Range, без выгрузки самих строк; count: exact, planned или estimated
+        result = await self._execute(self.client.table('participants').select('id', count=count).eq('draw_id', draw_id).limit(1), 'count_participants')
+        return result.count or 0
     
     async def get_participants(self, draw_id: str) -> List[Dict[str, Any]]:
-        result = self.client.table('participants').select('*').eq('draw_id', draw_id).execute()
+        result = await self._execute(self.client.table('participants').select('*').eq('draw_id', draw_id), 'get_participants')
         return result.data
     
+    async def iter_participants(self, draw_id: str, columns: str = 'id, user_id, first_name, username', page_size: int = PARTICIPANTS_PAGE_SIZE) -> AsyncIterator[Dict[str, Any]]:
+        last_id = None
+        while True:
+            rows = (await self._execute(select_participants_page(self.client, draw_id, columns, page_size, last_id), 'iter_participants')).data
+            if not rows:
+                return
+            for row in rows:
+                yield row
+            last_id = rows[-1]['id']
+    
     async def add_winners(self, draw_id: str, winners: List[Dict[str, Any]]):
         winners_data = [{'draw_id': draw_id, 'user_id': w['user_id'], 'first_name': w['first_name'], 'username': w.get('username')} for w in winners]
-        self.client.table('winners').insert(winners_data).execute()
+        await self._execute(self.client.table('winners').insert(winners_data), 'add_winners')
     
     async def get_winners(self, draw_id: str) -> List[Dict[str, Any]]:
-        result = self.client.table('winners').select('*').eq('draw_id', draw_id).execute()
+        # Объявление строится только в этом порядке — и в первой попытке, и при повторе,
+        # поэтому части совпадают, даже если id не растут в порядке вставки (uuid)
+        result = await self._execute(self.client.table('winners').select('*').eq('draw_id', draw_id).order('id'), 'get_winners')
         return result.data
 
-db = Database()
+db = Database()
\ No newline at end of file
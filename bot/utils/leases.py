@@ -0,0 +1,77 @@
+"""
+Координация нескольких реплик бота: heartbeat в БД и распределение розыгрышей
+"""
+import logging
+import os
+import socket
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Sequence
+
+from bot.utils.db import db
+
+logger = logging.getLogger(__name__)
+
+
+def default_replica_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def rendezvous_owner(key: str, replicas: Sequence[str]) -> Optional[str]:
+    """Реплика с наибольшим crc32(replica:key).
+
+    При появлении или пропаже реплики переезжают только ее розыгрыши,
+    остальные остаются у прежних владельцев.
+    """
+    if not replicas:
+        return None
+    return max(replicas, key=lambda replica: zlib.crc32(f"{replica}:{key}".encode()))
+
+
+class ReplicaCoordinator:
+    """Аренда (lease) реплики в таблице scheduler_replicas.
+
+    Реплика живая, пока ее heartbeat моложе lease_ttl секунд. Каждый
+    розыгрыш принадлежит одной живой реплике; после падения владельца
+    его розыгрыши переходят к другим в пределах lease_ttl плюс период
+    heartbeat. Гарантию «ровно один исполнитель» дает условный захват
+    розыгрыша в БД, распределение лишь разводит реплики по разным розыгрышам.
+    """
+
+    def __init__(self, replica_id: Optional[str] = None, lease_ttl: float = 30):
+        self.replica_id = replica_id or default_replica_id()
+        self.lease_ttl = timedelta(seconds=lease_ttl)
+        # До первого heartbeat реплика считает себя единственной
+        self.live: List[str] = [self.replica_id]
+        self.ready = False
+
+    async def heartbeat(self):
+        """Продлить свою аренду и обновить список живых реплик"""
+        now = datetime.now(timezone.utc)
+        await db.heartbeat(self.replica_id, now)
+        # Строки упавших реплик (по умолчанию id случайный) иначе копились бы в таблице
+        await db.remove_stale_replicas(now - self.lease_ttl)
+        replicas = set(await db.get_live_replicas(now - self.lease_ttl))
+        replicas.add(self.replica_id)
+        live = sorted(replicas)
+        if live != self.live:
+            logger.info(f"Живые реплики планировщика: {', '.join(live)}")
+        self.live = live
+        self.ready = True
+
+    def owner(self, draw_id: str) -> Optional[str]:
+        return rendezvous_owner(str(draw_id), self.live)
+
+    def owns(self, draw_id: str) -> bool:
+        return self.owner(draw_id) == self.replica_id
+
+    def is_alive(self, replica_id: Optional[str]) -> bool:
+        return replica_id in self.live
+
+    async def leave(self):
+        """Снять аренду при штатной остановке: розыгрыши сразу переходят к другим"""
+        try:
+            await db.remove_replica(self.replica_id)
+        except Exception as e:
+            logger.warning(f"Не удалось снять аренду реплики {self.replica_id}: {e}")
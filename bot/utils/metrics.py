@@ -0,0 +1,180 @@
+"""
+Метрики в текстовом формате Prometheus: счетчики и гистограммы без внешних зависимостей
+"""
+import bisect
+import logging
+from typing import TYPE_CHECKING, Callable, Dict, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин по умолчанию (секунды) — для сетевых вызовов
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, value: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge:
+    """Текущее значение; set_function — значение считается в момент выдачи метрик"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = lambda: value
+
+    def set_function(self, function: Callable[[], float], *labels: str):
+        self._values[labels] = function
+
+    def get(self, *labels: str) -> float:
+        function = self._values.get(labels)
+        return function() if function else 0
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {function()}" for key, function in self._values.items()]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: observe — один bisect и три сложения"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Метки -> [счетчики по корзинам (+Inf последней), сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._values.get(labels)
+        return series[2] if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._metrics.setdefault(name, Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+telegram_request_seconds = registry.histogram(
+    "telegram_request_seconds", "Длительность запросов к Bot API", ["method"]
+)
+telegram_errors_total = registry.counter(
+    "telegram_errors_total", "Ошибки Bot API по методам и кодам", ["method", "code"]
+)
+db_query_seconds = registry.histogram(
+    "db_query_seconds", "Длительность запросов к Supabase", ["method"]
+)
+db_errors_total = registry.counter(
+    "db_errors_total", "Ошибки запросов к Supabase", ["method", "error"]
+)
+scheduler_lag_seconds = registry.histogram(
+    "scheduler_lag_seconds", "Задержка завершения розыгрыша относительно end_date",
+    buckets=(0.5, 1, 5, 15, 30, 60, 300, 900, 3600)
+)
+fsm_step_seconds = registry.histogram(
+    "fsm_step_seconds", "Длительность обработки шага мастера по состоянию FSM", ["state"]
+)
+handler_seconds = registry.histogram(
+    "handler_seconds", "Длительность обработки апдейта по хендлеру и состоянию FSM", ["handler", "state"]
+)
+rate_limit_queue_depth = registry.gauge(
+    "rate_limit_queue_depth", "Исходящие запросы к Bot API, ожидающие лимита"
+)
+
+
+async def start_metrics_server(host: str, port: int, path: str = "/metrics") -> "web.AppRunner":
+    """Отдавать метрики по HTTP; возвращает runner для остановки"""
+    # aiohttp.web нужен только процессу бота, модулям api/* он не нужен
+    from aiohttp import web
+
+    async def handle(request: "web.Request") -> "web.Response":
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get(path, handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на {host}:{port}{path}")
+    return runner
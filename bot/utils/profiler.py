@@ -0,0 +1,74 @@
+"""
+Сэмплирующий профилировщик: стеки event loop в формате collapsed для flamegraph
+"""
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """Раз в interval секунд снимает стек потока, запустившего профилировщик.
+
+    Стеки копятся в памяти и раз в flush_interval секунд целиком
+    перезаписываются в path строками «frame;frame;frame count» — формат,
+    который понимают flamegraph.pl, speedscope и inferno. Снятие стека
+    идет из отдельного потока и не трогает event loop.
+    """
+
+    def __init__(self, path: str, interval: float = 0.01, flush_interval: float = 60):
+        self.path = path
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.stacks: Counter = Counter()
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._target)
+        if frame is None:
+            return
+        names = []
+        while frame is not None:
+            names.append(self._frame_name(frame))
+            frame = frame.f_back
+        self.stacks[";".join(reversed(names))] += 1
+
+    def _run(self):
+        waited = 0.0
+        while not self._stop.wait(self.interval):
+            self._sample()
+            waited += self.interval
+            if waited >= self.flush_interval:
+                waited = 0.0
+                self.flush()
+
+    def flush(self):
+        # Запись во временный файл и rename: читатель не увидит половину файла
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        os.replace(tmp_path, self.path)
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Профилировщик пишет стеки в {self.path} (интервал {self.interval} с)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
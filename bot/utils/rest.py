@@ -0,0 +1,58 @@
+"""
+Запросы PostgREST, общие для бота (Database) и serverless-функций api/*,
+и клиент Supabase для api/*: один на теплый инстанс, создается при первом запросе
+"""
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Поля розыгрыша, нужные для регистрации участника
+DRAW_META_COLUMNS = 'id, status, channels, end_date'
+
+_supabase: Optional["Client"] = None
+
+
+def is_malformed_id(error: Exception) -> bool:
+    """APIError 22P02: draw_id не является корректным идентификатором — то же, что «не найден»"""
+    return getattr(error, 'code', None) == '22P02'
+
+
+def select_draw_meta(client: "Client", draw_id: str):
+    return client.table('draws').select(DRAW_META_COLUMNS).eq('id', draw_id)
+
+
+def select_participant(client: "Client", draw_id: str, user_id: int):
+    # Точная проверка по индексу (draw_id, user_id)
+    return client.table('participants').select('id').eq('draw_id', draw_id).eq('user_id', user_id).limit(1)
+
+
+def upsert_participant(client: "Client", row: Dict[str, Any]):
+    # INSERT ... ON CONFLICT (draw_id, user_id) DO NOTHING: PostgREST возвращает только вставленные строки
+    return client.table('participants').upsert(row, on_conflict='draw_id,user_id', ignore_duplicates=True)
+
+
+def select_participants_page(client: "Client", draw_id: str, columns: str, page_size: int, after: Optional[Any] = None):
+    # Keyset-пагинация по id: каждая страница — отдельный короткий запрос, без OFFSET и лимита PostgREST
+    query = client.table('participants').select(columns).eq('draw_id', draw_id).order('id').limit(page_size)
+    return query.gt('id', after) if after is not None else query
+
+
+def get_supabase(supabase_url: str, supabase_key: str) -> "Client":
+    global _supabase
+    if _supabase is None:
+        # supabase и httpx импортируются здесь, а не при загрузке функции
+        from supabase import create_client
+        _supabase = create_client(supabase_url, supabase_key)
+    return _supabase
+
+
+def execute(supabase_url: str, supabase_key: str, build: Callable[["Client"], Any]):
+    """Выполнить запрос build(client); при оборванном соединении пересоздать клиент и повторить"""
+    global _supabase
+    import httpx
+    try:
+        return build(get_supabase(supabase_url, supabase_key)).execute()
+    except (httpx.RemoteProtocolError, httpx.ConnectError, httpx.ReadError, httpx.WriteError):
+        _supabase = None
+        return build(get_supabase(supabase_url, supabase_key)).execute()
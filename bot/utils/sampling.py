@@ -0,0 +1,32 @@
+"""
+Случайный выбор победителей из потока участников
+"""
+import heapq
+import random
+from itertools import count
+from typing import AsyncIterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+async def sample_stream(stream: AsyncIterable[T], k: int, rng: Optional[random.Random] = None) -> List[T]:
+    """Равномерно выбрать k элементов из потока за один проход.
+
+    Каждому элементу присваивается случайный ключ, и хранятся k элементов
+    с наименьшими ключами (bottom-k), поэтому память O(k) при любом размере
+    потока. Результат упорядочен по ключу, то есть перемешан.
+    """
+    rng = rng or random
+    if k <= 0:
+        return []
+
+    heap = []  # (-ключ, порядковый номер, элемент): на вершине наибольший ключ
+    tiebreak = count()
+    async for item in stream:
+        key = rng.random()
+        if len(heap) < k:
+            heapq.heappush(heap, (-key, next(tiebreak), item))
+        elif key < -heap[0][0]:
+            heapq.heapreplace(heap, (-key, next(tiebreak), item))
+
+    return [item for _, _, item in sorted(heap, reverse=True)]
@@ -1,128 +1,308 @@
 """
 Планировщик для автоматического завершения розыгрышей
 """
-import random
 import asyncio
 import logging
-from datetime import datetime
-from typing import List, Dict, Any
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Union
+from zoneinfo import ZoneInfo
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from aiogram import Bot
 
+from bot.middlewares.rate_limit import TokenBucket
 from bot.utils.db import db
-from bot.config import TIMEZONE
+from bot.utils.announce import no_participants_announcement, send_chunks, winners_announcement
+from bot.utils.channels import channel_registry
+from bot.utils.counter import participant_counter
+from bot.utils.dates import parse_end_date as _parse_end_date
+from bot.utils.leases import ReplicaCoordinator
+from bot.utils.metrics import scheduler_lag_seconds
+from bot.utils.checks import verify_membership
+from bot.utils.winners import select_winners
+from bot.config import (
+    TIMEZONE, SCHEDULER_HORIZON_HOURS, CHECK_TIMEOUT, COMPLETION_WORKERS, COMPLETION_RETRY_DELAY,
+    WINNER_RESERVE_RATIO, WINNER_CHECK_RATE, WINNER_CHECK_CONCURRENCY, WINNER_CHECK_TIMEOUT,
+    REPLICA_ID, HEARTBEAT_INTERVAL, LEASE_TTL
+)
 
 logger = logging.getLogger(__name__)
 
+def parse_end_date(value: Union[str, datetime]) -> datetime:
+    """Дата окончания в часовом поясе TIMEZONE"""
+    return _parse_end_date(value, TIMEZONE)
+
 class DrawScheduler:
-    """Планировщик завершения розыгрышей"""
+    """Планировщик завершения розыгрышей: разовая задача на end_date каждого активного розыгрыша"""
     
     def __init__(self, bot: Bot):
         self.bot = bot
         self.scheduler = AsyncIOScheduler(timezone=TIMEZONE)
+        self.horizon = timedelta(hours=SCHEDULER_HORIZON_HOURS)
+        # Пул исполнителей: одновременно завершается не больше COMPLETION_WORKERS розыгрышей
+        self.workers = asyncio.Semaphore(COMPLETION_WORKERS)
+        self.pending = 0
+        # Общий бюджет getChatMember на повторную проверку победителей
+        self.check_bucket = TokenBucket(WINNER_CHECK_RATE, max(1.0, WINNER_CHECK_RATE))
+        # Время завершения последних розыгрышей: (draw_id, секунды)
+        self.latencies: deque = deque(maxlen=100)
+        self.coordinator = ReplicaCoordinator(REPLICA_ID, LEASE_TTL)
+        # Розыгрыши, которые эта реплика сейчас завершает
+        self.in_progress: set = set()
+        # Event loop держит задачи по слабой ссылке: без этого набора завершение может собрать GC
+        self.tasks: set = set()
     
     def start(self):
         """Запустить планировщик"""
-        # Проверять каждую минуту
+        # Загрузить ближайшие дедлайны сейчас и затем раз в горизонт планирования
         self.scheduler.add_job(
-            self.check_draws,
-            trigger=IntervalTrigger(minutes=1),
-            id="check_draws",
+            self.load_draws,
+            trigger=IntervalTrigger(seconds=self.horizon.total_seconds()),
+            next_run_time=datetime.now(ZoneInfo(TIMEZONE)),
+            id="load_draws",
             replace_existing=True
         )
+        # Heartbeat реплики и обход просроченных и брошенных розыгрышей
+        self.scheduler.add_job(
+            self.coordinate,
+            trigger=IntervalTrigger(seconds=HEARTBEAT_INTERVAL),
+            next_run_time=datetime.now(ZoneInfo(TIMEZONE)),
+            id="coordinate",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
         self.scheduler.start()
-        logger.info("Планировщик запущен")
+        logger.info(f"Планировщик запущен, реплика {self.coordinator.replica_id}")
     
-    def stop(self):
-        """Остановить планировщик"""
+    async def stop(self):
+        """Остановить планировщик и освободить аренду реплики"""
         self.scheduler.shutdown()
+        await self.coordinator.leave()
         logger.info("Планировщик остановлен")
     
-    async def check_draws(self):
-        """Проверить активные розыгрыши"""
+    def spawn(self, coro):
+        """Запустить задачу в фоне, сохранив ссылку на нее до завершения"""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+    
+    async def coordinate(self):
+        """Продлить аренду и подобрать розыгрыши, которые никто не завершил"""
+        try:
+            await self.coordinator.heartbeat()
+        except Exception as e:
+            logger.error(f"Ошибка heartbeat реплики: {e}")
+            return
+        
         try:
-            active_draws = await db.get_active_draws()
-            now = datetime.now()
+            # Наступившие дедлайны своих розыгрышей, для которых здесь нет задачи:
+            # розыгрыш создан на другой реплике или перешел к этой от упавшей
+            now = datetime.now(ZoneInfo(TIMEZONE)).replace(tzinfo=None)
+            for draw in await db.get_due_draws(before=now):
+                if not self.coordinator.owns(draw["id"]) or draw["id"] in self.in_progress:
+                    continue
+                if self.scheduler.get_job(f"draw_{draw['id']}") is None:
+                    self.spawn(self.complete_draw_by_id(draw["id"]))
+            
+            for draw in await db.get_claimed_draws():
+                if draw["id"] in self.in_progress:
+                    continue
+                if draw.get("claimed_by") == self.coordinator.replica_id:
+                    # Свой розыгрыш, застрявший в completing без запланированного повтора
+                    # (например, release_draw не прошел при сбое БД)
+                    if self.scheduler.get_job(f"draw_{draw['id']}") is None:
+                        self.spawn(self.resume_draw(draw))
+                    continue
+                # Розыгрыши, захваченные репликой, аренда которой истекла
+                if self.coordinator.is_alive(draw.get("claimed_by")):
+                    continue
+                if not self.coordinator.owns(draw["id"]):
+                    continue
+                taken = await db.take_over_draw(draw, self.coordinator.replica_id)
+                if taken is not None:
+                    logger.warning(f"Розыгрыш {draw['id']} перехвачен у реплики {draw.get('claimed_by')}")
+                    self.spawn(self.resume_draw(taken))
+        
+        except Exception as e:
+            logger.error(f"Ошибка обхода розыгрышей: {e}")
+    
+    async def load_draws(self):
+        """Поставить задачи для розыгрышей, которые закончатся в пределах горизонта"""
+        try:
+            if not self.coordinator.ready:
+                # Распределение по репликам известно только после первого heartbeat
+                await self.coordinator.heartbeat()
+
+            # Граница сравнивается с end_date в том же виде, в каком он сохранен
+            before = datetime.now(ZoneInfo(TIMEZONE)).replace(tzinfo=None) + self.horizon
+            due_draws = await db.get_due_draws(before=before)
             
-            for draw in active_draws:
-                end_date = datetime.fromisoformat(draw["end_date"])
+            for draw in due_draws:
+                self.add_draw(draw["id"], draw["end_date"])
+            
+            logger.info(f"Загружено розыгрышей в индекс дедлайнов: {len(due_draws)}")
+        
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке розыгрышей: {e}")
+    
+    def add_draw(self, draw_id: str, end_date: Union[str, datetime], claim_any: bool = False):
+        """Запланировать завершение розыгрыша на его end_date"""
+        self.scheduler.add_job(
+            self.complete_draw_by_id,
+            trigger=DateTrigger(run_date=parse_end_date(end_date)),
+            args=[draw_id, claim_any],
+            id=f"draw_{draw_id}",
+            replace_existing=True,
+            # Просроченные (например, пока бот был выключен) завершаются сразу
+            misfire_grace_time=None,
+            coalesce=True
+        )
+    
+    async def complete_draw_by_id(self, draw_id: str, claim_any: bool = False):
+        """Захватить розыгрыш и завершить его в пуле исполнителей"""
+        if not claim_any and not self.coordinator.owns(draw_id):
+            # Завершит владелец; если он упадет, розыгрыш подберет coordinate
+            return
+        if draw_id in self.in_progress:
+            return
+        
+        self.in_progress.add(draw_id)
+        self.pending += 1
+        try:
+            async with self.workers:
+                self.pending -= 1
+                started = time.monotonic()
                 
-                if now >= end_date:
-                    logger.info(f"Завершаем розыгрыш {draw['id']}")
-                    await self.complete_draw(draw)
+                draw = await db.claim_draw(draw_id, self.coordinator.replica_id)
+                if draw is None:
+                    # Уже завершен или завершается другим исполнителем
+                    return
+                
+                logger.info(f"Завершаем розыгрыш {draw_id}")
+                await self.complete_draw(draw)
+                
+                elapsed = time.monotonic() - started
+                self.latencies.append((draw_id, elapsed))
+                lag = datetime.now(ZoneInfo(TIMEZONE)) - parse_end_date(draw["end_date"])
+                scheduler_lag_seconds.observe(max(0.0, lag.total_seconds()))
+                logger.info(f"Розыгрыш {draw_id} завершен за {elapsed:.2f} с, в очереди: {self.pending}")
         
         except Exception as e:
-            logger.error(f"Ошибка при проверке розыгрышей: {e}")
+            logger.error(f"Ошибка при завершении розыгрыша {draw_id}: {e}")
+        finally:
+            self.in_progress.discard(draw_id)
+    
+    async def resume_draw(self, draw: Dict[str, Any]):
+        """Повторить завершение розыгрыша, который уже в статусе completing"""
+        draw_id = draw["id"]
+        if draw_id in self.in_progress:
+            return
+        self.in_progress.add(draw_id)
+        try:
+            async with self.workers:
+                await self.complete_draw(draw)
+        except Exception as e:
+            logger.error(f"Ошибка при повторном завершении розыгрыша {draw_id}: {e}")
+        finally:
+            self.in_progress.discard(draw_id)
     
     async def complete_draw(self, draw: Dict[str, Any]):
-        """Завершить розыгрыш и выбрать победителей"""
+        """Завершить захваченный розыгрыш: выбрать победителей и объявить итоги"""
         draw_id = draw["id"]
+        retry_at = datetime.now(ZoneInfo(TIMEZONE)) + timedelta(seconds=COMPLETION_RETRY_DELAY)
         
         try:
-            # Получить всех участников
-            participants = await db.get_participants(draw_id)
-            
-            if not participants:
-                logger.warning(f"Розыгрыш {draw_id} не имеет участников")
-                await db.update_draw_status(draw_id, "completed")
-                
-                # Отправить сообщение в канал
-                first_channel = draw["channels"][0]["username"]
-                await self.bot.send_message(
-                    chat_id=first_channel,
-                    text=f"🎉 Розыгрыш \"{draw['title']}\" завершен!\n\n"
-                         f"❌ К сожалению, не было участников.",
-                    parse_mode="Markdown"
-                )
-                return
-            
-            # Выбрать победителей
-            winners_count = min(draw["winners_count"], len(participants))
-            winners = random.sample(participants, winners_count)
-            
-            # Сохранить победителей в БД
-            await db.add_winners(draw_id, winners)
-            
-            # Обновить статус розыгрыша
-            await db.update_draw_status(draw_id, "completed")
-            
-            # Сформировать сообщение с победителями
-            winners_text = self.format_winners_message(draw, winners)
-            
-            # Отправить в канал
-            first_channel = draw["channels"][0]["username"]
-            await self.bot.send_message(
-                chat_id=first_channel,
-                text=winners_text,
-                parse_mode="Markdown"
+            # Победители могли быть выбраны в прошлой попытке — тогда выбор не повторяется
+            winners = await db.get_winners(draw_id)
+            if not winners:
+                winners = await self.select_winners(draw)
+                if winners:
+                    await db.add_winners(draw_id, winners)
+                    # Порядок — как его прочитает повтор, иначе продолжение с части N разойдется с уже отправленным
+                    winners = await db.get_winners(draw_id)
+        except Exception:
+            # Победители не сохранены: вернуть розыгрыш в active и повторить позже.
+            # Если и release не прошел (БД недоступна), розыгрыш остается в completing
+            # и его подберет coordinate
+            try:
+                await db.release_draw(draw_id)
+            finally:
+                self.add_draw(draw_id, retry_at)
+            raise
+        
+        try:
+            await self.announce(draw, winners)
+        except Exception:
+            # Розыгрыш остается в completing (регистрация закрыта), объявление
+            # продолжится с первой неотправленной части
+            self.scheduler.add_job(
+                self.resume_draw,
+                trigger=DateTrigger(run_date=retry_at),
+                args=[draw],
+                id=f"draw_{draw_id}",
+                replace_existing=True,
+                misfire_grace_time=None
             )
-            
-            logger.info(f"Розыгрыш {draw_id} успешно завершен. Победителей: {len(winners)}")
+            raise
         
-        except Exception as e:
-            logger.error(f"Ошибка при завершении розыгрыша {draw_id}: {e}")
+        await db.update_draw_status(draw_id, "completed")
+        db.membership_filters.drop(draw_id)
+        participant_counter.untrack(draw_id)
+        
+        if not winners:
+            logger.warning(f"Розыгрыш {draw_id} не имеет участников")
+        else:
+            logger.info(f"Розыгрыш {draw_id} успешно завершен. Победителей: {len(winners)}")
     
-    def format_winners_message(self, draw: Dict[str, Any], winners: List[Dict[str, Any]]) -> str:
-        """Форматировать сообщение с победителями"""
-        text = f"🏆 **Розыгрыш \"{draw['title']}\" завершен!**\n\n"
-        text += f"🎁 **Призы:**\n{draw['prizes']}\n\n"
-        text += f"🎉 **Победители:**\n\n"
+    async def select_winners(self, draw: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Выбрать победителей среди участников, которые по-прежнему подписаны на все каналы"""
+        channels = [channel["username"] for channel in draw["channels"]]
         
-        for i, winner in enumerate(winners, 1):
-            name = winner["first_name"]
-            username = winner.get("username")
-            
-            if username:
-                # Кликабельная ссылка на пользователя
-                text += f"{i}. [{name}](https://t.me/{username})\n"
-            else:
-                # Просто имя без ссылки
-                text += f"{i}. {name}\n"
+        async def is_eligible(user_id: int) -> Optional[bool]:
+            # Без кэша: нужен статус на момент завершения. Каналы по очереди, чтобы
+            # не тратить запросы после первого отказа; лимит — на каждый getChatMember
+            verified = True
+            for channel in channels:
+                wait = self.check_bucket.reserve(time.monotonic())
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                try:
+                    subscribed = await asyncio.wait_for(verify_membership(self.bot, user_id, channel), CHECK_TIMEOUT)
+                except asyncio.TimeoutError:
+                    subscribed = None
+                if subscribed is False:
+                    return False
+                if subscribed is None:
+                    verified = False
+            return True if verified else None
+        
+        return await select_winners(
+            lambda: db.iter_participants(draw["id"]),
+            draw["winners_count"],
+            is_eligible,
+            reserve_ratio=WINNER_RESERVE_RATIO,
+            concurrency=WINNER_CHECK_CONCURRENCY,
+            timeout=WINNER_CHECK_TIMEOUT
+        )
+    
+    async def announce(self, draw: Dict[str, Any], winners: List[Dict[str, Any]]):
+        """Отправить итоги в первый канал розыгрыша, сохраняя прогресс по частям"""
+        if winners:
+            chunks = winners_announcement(draw, winners)
+        else:
+            chunks = no_participants_announcement(draw)
+        chat_id = await channel_registry.resolve_chat_id(self.bot, draw["channels"][0]["username"])
         
-        text += "\n🎊 Поздравляем победителей!"
+        async def on_sent(index: int):
+            draw["announced_chunks"] = index + 1
+            await db.set_announced_chunks(draw["id"], index + 1)
         
-        return text
+        await send_chunks(self.bot, chat_id, chunks, start=draw.get("announced_chunks") or 0, on_sent=on_sent)
 
 # Глобальный экземпляр (будет инициализирован в main.py)
 scheduler: DrawScheduler = None
@@ -132,3 +312,10 @@ def init_scheduler(bot: Bot):
     global scheduler
     scheduler = DrawScheduler(bot)
     return scheduler
+
+def schedule_draw(draw_id: str, end_date: Union[str, datetime]):
+    """Добавить новый розыгрыш в индекс дедлайнов запущенного планировщика"""
+    if scheduler is not None:
+        # Владелец узнает о новом розыгрыше только при обходе, поэтому создавшая
+        # реплика захватывает его сама; условный захват оставит одного исполнителя
+        scheduler.add_draw(draw_id, end_date, claim_any=True)
@@ -0,0 +1,116 @@
+"""
+Хранилища состояний FSM: SQLite (WAL) на диске или Redis для нескольких инстансов
+"""
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM в SQLite в режиме WAL.
+
+    Состояние и данные пользователя лежат в одной строке, поэтому
+    update_data и очистка выполняются одной транзакцией. Записи живут
+    ttl секунд с последнего изменения: брошенные мастера удаляются.
+    Все обращения к файлу идут через один поток.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, key_builder: Optional[KeyBuilder] = None):
+        self.path = path
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fsm')
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}', expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fsm_expires_at ON fsm (expires_at)")
+        self._writes = 0
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    def _read(self, key: str) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT state, data FROM fsm WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+
+    def _write(self, key: str, column: str, value: Optional[str]):
+        # Истекшая запись удаляется целиком: иначе upsert оживит ее вторую колонку
+        # (например, данные брошенного мастера после нового set_state)
+        self._conn.execute("DELETE FROM fsm WHERE key = ? AND expires_at <= ?", (key, time.time()))
+        self._conn.execute(
+            f"INSERT INTO fsm (key, {column}, expires_at) VALUES (?, ?, ?) "
+            f"ON CONFLICT (key) DO UPDATE SET {column} = excluded.{column}, expires_at = excluded.expires_at",
+            (key, value, self._expires_at())
+        )
+        # Пустые записи (после state.clear()) не хранятся
+        self._conn.execute("DELETE FROM fsm WHERE key = ? AND state IS NULL AND data = '{}'", (key,))
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._conn.execute("DELETE FROM fsm WHERE expires_at <= ?", (time.time(),))
+
+    def _update_data(self, key: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._read(key)
+            current = json.loads(row[1]) if row else {}
+            current.update(data)
+            self._write(key, "data", json.dumps(current, ensure_ascii=False))
+        return current
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._run(self._write, self.key_builder.build(key), "state", value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._run(self._read, self.key_builder.build(key))
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._run(self._write, self.key_builder.build(key), "data", json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._run(self._read, self.key_builder.build(key))
+        return json.loads(row[1]) if row else {}
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._run(self._update_data, self.key_builder.build(key), data)
+
+    async def close(self) -> None:
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=False)
+
+
+def create_storage(backend: str, sqlite_path: str, redis_url: Optional[str], ttl: Optional[float]) -> BaseStorage:
+    """Хранилище FSM по имени: memory, sqlite или redis"""
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage(sqlite_path, ttl=ttl)
+    if backend == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError:
+            raise ValueError("FSM_STORAGE=redis требует пакет redis: pip install -r requirements.txt")
+        return RedisStorage.from_url(
+            redis_url,
+            key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+            state_ttl=int(ttl) if ttl else None,
+            data_ttl=int(ttl) if ttl else None
+        )
+    raise ValueError(f"Неизвестное хранилище FSM: {backend}")
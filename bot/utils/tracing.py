@@ -0,0 +1,42 @@
+"""
+Разбивка времени обработки апдейта: Telegram, БД и собственный код
+"""
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class Trace:
+    """Время и число внешних вызовов в рамках одного апдейта"""
+
+    __slots__ = ("started", "handler", "durations", "calls")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.handler: Optional[str] = None
+        self.durations: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    def add(self, kind: str, seconds: float):
+        self.durations[kind] = self.durations.get(kind, 0.0) + seconds
+        self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def breakdown(self) -> Dict[str, float]:
+        """Длительности в мс; own — время вне внешних вызовов"""
+        total = time.perf_counter() - self.started
+        external = sum(self.durations.values())
+        result = {"total": total * 1000}
+        result.update((kind, seconds * 1000) for kind, seconds in self.durations.items())
+        # Параллельные вызовы могут в сумме превысить общее время
+        result["own"] = max(0.0, total - external) * 1000
+        return result
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def record(kind: str, seconds: float):
+    """Учесть внешний вызов в трассе текущего апдейта (вне апдейта — ничего не делает)"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(kind, seconds)
@@ -0,0 +1,75 @@
+"""
+Проверка подписи initData Telegram WebApp (только стандартная библиотека)
+"""
+import hashlib
+import hmac
+import json
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode
+
+
+class InitDataError(ValueError):
+    """initData без подписи, с неверной подписью или устаревшая"""
+
+
+@lru_cache(maxsize=4)
+def secret_key(bot_token: str) -> bytes:
+    """HMAC_SHA256(key="WebAppData", msg=bot_token); считается один раз на процесс"""
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+def _data_check_string(fields: Dict[str, str]) -> bytes:
+    return "\n".join(f"{key}={fields[key]}" for key in sorted(fields)).encode()
+
+
+def sign_init_data(fields: Dict[str, Any], bot_token: str) -> str:
+    """initData с подписью, как ее формирует Telegram (для нагрузочных прогонов и отладки)"""
+    values = {
+        key: json.dumps(value, ensure_ascii=False, separators=(",", ":")) if isinstance(value, dict) else str(value)
+        for key, value in fields.items()
+    }
+    values["hash"] = hmac.new(secret_key(bot_token), _data_check_string(values), hashlib.sha256).hexdigest()
+    return urlencode(values)
+
+
+def validate_init_data(
+    init_data: str,
+    bot_token: str,
+    max_age: float = 3600,
+    now: Optional[float] = None
+) -> Dict[str, Any]:
+    """Проверить подпись и свежесть initData; вернуть поля, user — разобранным словарем.
+
+    Сначала сверяется подпись (одна HMAC, без сети и БД), затем auth_date:
+    подпись старше max_age секунд (0 — не проверять) отклоняется.
+    """
+    if not init_data or not isinstance(init_data, str):
+        raise InitDataError("initData отсутствует")
+    if len(init_data) > 8192:
+        raise InitDataError("initData слишком длинная")
+    try:
+        fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=True))
+    except ValueError:
+        raise InitDataError("initData не разобрана")
+    received = fields.pop("hash", "")
+    expected = hmac.new(secret_key(bot_token), _data_check_string(fields), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(received, expected):
+        raise InitDataError("неверная подпись initData")
+
+    try:
+        auth_date = int(fields["auth_date"])
+    except (KeyError, ValueError):
+        raise InitDataError("в initData нет auth_date")
+    age = (time.time() if now is None else now) - auth_date
+    # Небольшой запас на расхождение часов в обе стороны
+    if age < -60 or (max_age > 0 and age > max_age):
+        raise InitDataError("initData устарела")
+
+    result: Dict[str, Any] = dict(fields)
+    try:
+        result["user"] = json.loads(fields["user"]) if "user" in fields else None
+    except ValueError:
+        raise InitDataError("поле user не разобрано")
+    return result
@@ -0,0 +1,98 @@
+"""
+Выбор победителей с повторной проверкой подписок и добором замен
+"""
+import asyncio
+import logging
+import math
+import random
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from bot.utils.sampling import sample_stream
+
+logger = logging.getLogger(__name__)
+
+
+async def _exclude(stream: AsyncIterable[Dict[str, Any]], user_ids: Set[int]) -> AsyncIterator[Dict[str, Any]]:
+    async for row in stream:
+        if int(row["user_id"]) not in user_ids:
+            yield row
+
+
+async def check_candidates(
+    candidates: List[Dict[str, Any]],
+    is_eligible: Callable[[int], Awaitable[Optional[bool]]],
+    concurrency: int,
+    deadline: float
+) -> Dict[int, Optional[bool]]:
+    """Проверить кандидатов параллельно до deadline (monotonic); не успевшие в результат не попадают"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results: Dict[int, Optional[bool]] = {}
+
+    async def run(user_id: int):
+        async with semaphore:
+            try:
+                results[user_id] = await is_eligible(user_id)
+            except Exception:
+                # Ошибка проверки — «не проверен», а не отказ
+                results[user_id] = None
+
+    tasks = [asyncio.create_task(run(int(candidate["user_id"]))) for candidate in candidates]
+    try:
+        await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
+
+
+async def select_winners(
+    participants: Callable[[], AsyncIterable[Dict[str, Any]]],
+    winners_count: int,
+    is_eligible: Callable[[int], Awaitable[Optional[bool]]],
+    reserve_ratio: float = 0.2,
+    concurrency: int = 10,
+    timeout: float = 60,
+    rng: Optional[random.Random] = None
+) -> List[Dict[str, Any]]:
+    """Выбрать до winners_count победителей; is_eligible: True, False — отсеять, None — не удалось проверить"""
+    deadline = time.monotonic() + timeout
+    checked: Set[int] = set()
+    winners: List[Dict[str, Any]] = []
+    rejected = unverified = 0
+    size = winners_count + max(1, math.ceil(winners_count * reserve_ratio))
+
+    while len(winners) < winners_count and time.monotonic() < deadline:
+        candidates = await sample_stream(_exclude(participants(), checked), size, rng)
+        if not candidates:
+            break
+
+        results = await check_candidates(candidates, is_eligible, concurrency, deadline)
+        for candidate in candidates:
+            user_id = int(candidate["user_id"])
+            checked.add(user_id)
+            if len(winners) >= winners_count:
+                continue
+            eligible = results.get(user_id)
+            # Сбой Telegram не должен лишать выигрыша: отсеиваются только точные отказы
+            if eligible is None:
+                unverified += 1
+                winners.append(candidate)
+            elif eligible:
+                winners.append(candidate)
+            else:
+                rejected += 1
+
+        if len(candidates) < size:
+            # Участники кончились
+            break
+        # Следующий проход — с учетом доли отсеянных, но не меньше чем вдвое: проходов O(log N)
+        need = winners_count - len(winners)
+        accepted = len(checked) - rejected
+        expected = math.ceil(need * len(checked) / accepted) if accepted else size * 2
+        size = max(size * 2, expected + math.ceil(expected * reserve_ratio))
+
+    if rejected or unverified:
+        logger.info(f"Выбор победителей: отсеяно {rejected}, принято без проверки {unverified}")
+    return winners
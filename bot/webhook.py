@@ -0,0 +1,144 @@
+"""
+Прием апдейтов через webhook (aiohttp) с ограниченным пулом обработчиков
+"""
+import asyncio
+import hmac
+import logging
+import signal
+from contextlib import suppress
+from typing import List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def update_owner(update: Update) -> int:
+    """Пользователь (или чат), к которому относится апдейт"""
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, "chat", None)
+    return chat.id if chat is not None else update.update_id
+
+
+class UpdateWorkers:
+    """Очереди апдейтов с фиксированным числом обработчиков.
+
+    Апдейты одного пользователя всегда попадают в одну очередь и
+    обрабатываются по порядку, поэтому FSM мастера создания розыгрыша
+    не видит гонок. Если очередь заполнена, апдейт не принимается.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int = 8, queue_size: int = 1000):
+        self.dp = dp
+        self.bot = bot
+        per_worker = max(1, queue_size // workers)
+        self.queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self.queues]
+
+    def put(self, update: Update) -> bool:
+        """Поставить апдейт в очередь; False — очередь переполнена"""
+        queue = self.queues[update_owner(update) % len(self.queues)]
+        try:
+            queue.put_nowait(update)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                logger.error(f"Ошибка при обработке апдейта {update.update_id}: {e}")
+            finally:
+                queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Дообработать принятые апдейты и остановить обработчиков"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не дообработано апдейтов: {self.depth}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    url: str,
+    path: str,
+    secret: str,
+    host: str,
+    port: int,
+    workers: int,
+    queue_size: int,
+    drain_timeout: float = 30
+):
+    """Зарегистрировать webhook и принимать апдейты до SIGTERM/SIGINT или отмены"""
+    update_workers = UpdateWorkers(dp, bot, workers=workers, queue_size=queue_size)
+    accepting = True
+    stop = asyncio.Event()
+
+    async def handle(request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=401)
+        if not accepting:
+            return web.Response(status=503)
+        update = Update.model_validate(await request.json(), context={"bot": bot})
+        if not update_workers.put(update):
+            # Telegram повторит доставку позже
+            return web.Response(status=503)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+
+    update_workers.start()
+    await bot.set_webhook(
+        url=url.rstrip("/") + path,
+        secret_token=secret,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=workers
+    )
+    logger.info(f"Webhook запущен на {host}:{port}{path}")
+
+    # Как start_polling: SIGTERM оркестратора останавливает прием штатно,
+    # принятые апдейты дообрабатываются, main освобождает аренду и хранилище
+    loop = asyncio.get_running_loop()
+    signals = (signal.SIGTERM, signal.SIGINT)
+    with suppress(NotImplementedError):
+        # На Windows обработчики сигналов не поддерживаются
+        for sig in signals:
+            loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+        logger.info("Получен сигнал остановки")
+    finally:
+        with suppress(NotImplementedError):
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+        accepting = False
+        await update_workers.drain(drain_timeout)
+        await runner.cleanup()
+        logger.info("Webhook остановлен")
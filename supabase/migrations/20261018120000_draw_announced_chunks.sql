@@ -0,0 +1,3 @@
+-- Сколько частей объявления итогов уже отправлено в канал:
+-- повторная попытка продолжает с первой неотправленной части
+alter table draws add column if not exists announced_chunks integer not null default 0;
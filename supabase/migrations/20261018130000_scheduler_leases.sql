@@ -0,0 +1,9 @@
+-- Аренды реплик планировщика: реплика живая, пока heartbeat_at свежее LEASE_TTL
+create table if not exists scheduler_replicas (
+    replica_id text primary key,
+    heartbeat_at timestamptz not null
+);
+
+-- Какая реплика завершает розыгрыш (status = 'completing') и с какого момента
+alter table draws add column if not exists claimed_by text;
+alter table draws add column if not exists claimed_at timestamptz;
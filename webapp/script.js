@@ -25,8 +25,49 @@ function showScreen(screenName) {
     screens[screenName].classList.add('active');
 }
 
-// Проверка участия
-async function checkParticipation() {
+// Сводка розыгрыша: ответ кэширует CDN, браузер сверяется по ETag
+function formatEndDate(value, timezone) {
+    const [date, time] = value.split('T');
+    const [year, month, day] = date.split('-');
+    return `${day}.${month}.${year} ${time.slice(0, 5)} (${timezone})`;
+}
+
+async function loadDrawInfo() {
+    if (!drawId) {
+        return;
+    }
+    
+    try {
+        const response = await fetch('/api/draw?draw_id=' + encodeURIComponent(drawId));
+        if (!response.ok) {
+            return;
+        }
+        const draw = (await response.json()).draw;
+        
+        document.getElementById('draw-title').textContent = draw.title;
+        document.getElementById('draw-prizes').textContent = '🎁 ' + draw.prizes;
+        document.getElementById('draw-end').textContent =
+            (draw.status === 'active' ? '⏰ Итоги: ' : '🏁 Завершен: ') + formatEndDate(draw.end_date, draw.timezone);
+        document.getElementById('draw-participants').textContent = '👥 Участников: ' + draw.participants;
+        
+        const channels = document.getElementById('draw-channels');
+        channels.replaceChildren(...draw.channels.map(channel => {
+            const link = document.createElement('a');
+            link.className = 'channel-item';
+            link.target = '_blank';
+            link.href = `https://t.me/${channel.replace('@', '')}`;
+            link.textContent = channel;
+            return link;
+        }));
+        document.getElementById('draw-info').style.display = 'block';
+    } catch (error) {
+        // Без сводки проверка участия все равно работает
+        console.error('Draw info error:', error);
+    }
+}
+
+// Проверка участия; retry — повторная проверка после подписки, без кэша отказов
+async function checkParticipation(retry = false) {
     if (!drawId) {
         showScreen('fatalError');
         document.getElementById('fatal-error-message').textContent = 'Неверная ссылка на розыгрыш';
@@ -45,11 +86,11 @@ async function checkParticipation() {
             headers: {
                 'Content-Type': 'application/json',
             },
+            // Сервер берет пользователя из подписанной initData
             body: JSON.stringify({
-                user_id: user.id,
-                first_name: user.first_name,
-                username: user.username || null,
-                draw_id: drawId
+                init_data: tg.initData,
+                draw_id: drawId,
+                retry: retry
             })
         });
         
@@ -105,10 +146,11 @@ async function checkParticipation() {
 // Кнопка повторной проверки
 document.getElementById('retry-btn').addEventListener('click', () => {
     showScreen('loading');
-    setTimeout(checkParticipation, 500);
+    setTimeout(() => checkParticipation(true), 500);
 });
 
 // Запуск проверки при загрузке
+loadDrawInfo();
 checkParticipation();
 
 // Закрытие Mini App по кнопке Back